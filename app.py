@@ -1,5 +1,8 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, Response
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, Response, stream_with_context
 import os
+import json
+import re
+import time
 from datetime import datetime
 from utils.fencing_ai import FencingAI
 from utils.danmaku_system import DanmakuSystem
@@ -7,13 +10,16 @@ from utils.fie_data import FIEDataCollector
 from utils.youtube_parser import YouTubeParser
 from utils.video_analyzer import VideoAnalyzer
 from utils.knowledge_recommender import KnowledgeRecommender
-from utils.local_video_processor import LocalVideoProcessor, job_store
+from utils.local_video_processor import LocalVideoProcessor, job_store, video_store
+from utils.analysis_scheduler import INTERACTIVE, LANES, QueueFull, analysis_scheduler
+from utils.chunked_upload import upload_sessions, DEFAULT_CHUNK_SIZE
+from utils.model_output import extract_list_items
 from config import Config
 
 app = Flask(__name__)
 config = Config()
 app.secret_key = config.SECRET_KEY
-# 100MB 上传限制
+# 100MB 单请求上限（更大的文件由前端走 /api/upload_chunked 分片上传）
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024
 
 # 开发模式禁用静态资源缓存，方便 i18n 改动即时生效
@@ -32,6 +38,8 @@ youtube_parser = YouTubeParser()
 video_analyzer = VideoAnalyzer()
 knowledge_recommender = KnowledgeRecommender()
 local_video_processor = LocalVideoProcessor()
+# 上次进程退出时未完成的分析任务由服务进程启动后重新排队（run.py / gunicorn.conf.py），
+# 不在导入时执行：reloader 父进程、spawn 出的转码子进程也会导入本模块
 
 
 # ============================================================
@@ -266,19 +274,8 @@ def quick_questions():
             short_response=True  # 限制返回短文本
         )
 
-        # 解析 4 个问题
-        questions = []
-        for line in questions_text.split('\n'):
-            line = line.strip()
-            # 去除可能的编号（"1." "1、" "①" 等）
-            import re
-            line = re.sub(r'^[0-9①②③④⑤⑥⑦⑧⑨⑩]+[\.、\s]\s*', '', line)
-            # 去除 - * 等符号
-            line = re.sub(r'^[-*•\.\s]+', '', line)
-            if line and len(line) > 2:
-                questions.append(line)
-            if len(questions) >= 4:
-                break
+        # 解析 4 个问题（去编号 / 项目符号，过滤过短的行）
+        questions = extract_list_items(questions_text, limit=4)
 
         # 如果不足 4 个，用剑种默认问题补全
         defaults = {
@@ -387,95 +384,287 @@ def upload_video():
         f = request.files['video']
         if not f or not f.filename:
             return jsonify({'error': '文件无效'}), 400
-        content = f.read()
-        if not content:
-            return jsonify({'error': '文件内容为空'}), 400
+        # 流式写盘：不把整个文件读进内存
         try:
-            saved = local_video_processor.save_upload(f.filename, content)
+            saved = local_video_processor.save_upload_stream(f.filename, f.stream)
         except ValueError as ve:
             return jsonify({'error': str(ve)}), 400
 
-        video_id = saved['video_id']
-
-        # 已有分析结果？直接返回，避免重复分析
-        existing = local_video_processor.load_analysis(video_id)
-        if existing:
-            session['current_local_video'] = {
-                'video_id': video_id,
-                'filename': f.filename,
-                'size': saved['size'],
-                'analyzed': True,
-            }
-            return jsonify({
-                'success': True,
-                'video_id': video_id,
-                'filename': f.filename,
-                'size': saved['size'],
-                'cached': True,
-                'analysis': existing,
-            })
-
-        # 否则启动异步分析
         weapon_hint = (request.form.get('weapon') or '').strip()
         lang = (request.form.get('lang') or 'zh').strip().lower()
-        if lang not in ('zh', 'en', 'ja'):
-            lang = 'zh'
-        job_id = local_video_processor.analyze_async(video_id, saved['path'], weapon_hint, lang)
+        return _start_local_analysis(saved, f.filename, weapon_hint, lang, request.form.get('lane'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/upload_precheck', methods=['POST'])
+def upload_precheck():
+    """
+    上传前预检：前端先算内容哈希（BLAKE2s，即 video_id），服务器已有该视频时无需再上传。
+    请求体：{ hash, filename, weapon?, lang?, lane? }
+    - 视频和分析都在：直接返回缓存分析
+    - 只有视频：直接启动分析
+    - 都没有：exists=false，前端继续正常上传
+    """
+    try:
+        data = request.get_json() or {}
+        video_id = (data.get('hash') or '').strip().lower()
+        filename = (data.get('filename') or '').strip()
+        if not re.fullmatch(r'[0-9a-f]{16}', video_id):
+            return jsonify({'error': '无效的内容哈希'}), 400
+
+        path = video_store.find(video_id)
+        if not path:
+            return jsonify({'success': True, 'exists': False})
+
+        video_store.add_alias(video_id, filename)
+        saved = {'video_id': video_id, 'path': path, 'size': os.path.getsize(path)}
+        weapon_hint = (data.get('weapon') or '').strip()
+        lang = (data.get('lang') or 'zh').strip().lower()
+        return _start_local_analysis(saved, filename or os.path.basename(path), weapon_hint, lang, data.get('lane'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _start_local_analysis(saved: dict, filename: str, weapon_hint: str, lang: str, lane: str = None):
+    """文件落盘后的公共流程：命中已有分析直接返回，否则启动异步分析
+
+    lane：interactive（默认，页面上传、用户在等结果）或 batch（批量导入，不占用为页面上传预留的线程）
+    """
+    video_id = saved['video_id']
+    if lang not in ('zh', 'en', 'ja'):
+        lang = 'zh'
+    lane = (lane or '').strip().lower()
+    if lane not in LANES:
+        lane = INTERACTIVE
+
+    # 已有分析结果？直接返回（按请求语言叠加翻译层），避免重复分析
+    existing = local_video_processor.load_analysis(video_id, lang)
+    if existing:
         session['current_local_video'] = {
             'video_id': video_id,
-            'filename': f.filename,
+            'filename': filename,
             'size': saved['size'],
-            'job_id': job_id,
-            'analyzed': False,
+            'analyzed': True,
         }
         return jsonify({
             'success': True,
+            'exists': True,
             'video_id': video_id,
-            'filename': f.filename,
+            'filename': filename,
             'size': saved['size'],
-            'job_id': job_id,
-            'cached': False,
+            'cached': True,
+            'analysis': existing,
         })
+
+    # 否则启动异步分析；队列满时返回 429（视频已保存，稍后重试走预检无需重新上传）
+    try:
+        job_id, attached = local_video_processor.analyze_async(video_id, saved['path'], weapon_hint, lang, lane)
+    except QueueFull as qf:
+        resp = jsonify({'success': False, 'error': str(qf), 'video_id': video_id, 'queue_full': True})
+        resp.headers['Retry-After'] = '30'
+        return resp, 429
+    session['current_local_video'] = {
+        'video_id': video_id,
+        'filename': filename,
+        'size': saved['size'],
+        'job_id': job_id,
+        'analyzed': False,
+    }
+    return jsonify({
+        'success': True,
+        'exists': True,
+        'video_id': video_id,
+        'filename': filename,
+        'size': saved['size'],
+        'job_id': job_id,
+        'cached': False,
+        # 同一视频已在分析中：复用该任务，不重复分析
+        'attached': attached,
+    })
+
+
+# ------------------------------------------------------------
+# 分片上传（断点续传）：init → PUT 分片(offset) → finalize
+# ------------------------------------------------------------
+@app.route('/api/upload_chunked/init', methods=['POST'])
+def upload_chunked_init():
+    """登记分片上传会话。请求体：{ filename, size, weapon?, lang?, lane? }"""
+    try:
+        data = request.get_json() or {}
+        filename = (data.get('filename') or '').strip()
+        if not filename:
+            return jsonify({'error': '请提供文件名'}), 400
+        try:
+            size = int(data.get('size') or 0)
+            meta = {
+                'weapon': (data.get('weapon') or '').strip(),
+                'lang': (data.get('lang') or 'zh').strip().lower(),
+                'lane': (data.get('lane') or '').strip().lower(),
+            }
+            upload_sessions.cleanup()
+            info = upload_sessions.create(filename, size, meta)
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+        return jsonify({'success': True, 'chunk_size': DEFAULT_CHUNK_SIZE, **info})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/analyze_status/<job_id>', methods=['GET'])
-def analyze_status(job_id: str):
-    """轮询分析任务状态"""
-    job = job_store.get(job_id)
-    if not job:
-        return jsonify({'error': '任务不存在或已过期'}), 404
-    return jsonify({
+@app.route('/api/upload_chunked/<upload_id>', methods=['PUT'])
+def upload_chunked_put(upload_id: str):
+    """上传一个分片：请求体为原始字节，?offset= 指定写入位置（可并行、可重试）"""
+    try:
+        try:
+            offset = int(request.args.get('offset', ''))
+            info = upload_sessions.write_chunk(upload_id, offset, request.stream)
+        except KeyError:
+            return jsonify({'error': '上传会话不存在或已过期'}), 404
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+        return jsonify({'success': True, **info})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/upload_chunked/<upload_id>', methods=['GET'])
+def upload_chunked_status(upload_id: str):
+    """查询已收到的区间（断线后据此续传）"""
+    info = upload_sessions.status(upload_id)
+    if not info:
+        return jsonify({'error': '上传会话不存在或已过期'}), 404
+    return jsonify({'success': True, **info})
+
+
+@app.route('/api/upload_chunked/<upload_id>/finalize', methods=['POST'])
+def upload_chunked_finalize(upload_id: str):
+    """所有分片到齐后落盘，并走与 /api/upload_video 相同的分析流程"""
+    try:
+        try:
+            info = upload_sessions.finalize(upload_id)
+        except KeyError:
+            return jsonify({'error': '上传会话不存在或已过期'}), 404
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 409
+        try:
+            saved = local_video_processor.save_upload_file(info['filename'], info['part_path'])
+        except ValueError as ve:
+            return jsonify({'error': str(ve)}), 400
+        upload_sessions.discard(upload_id)
+        meta = info['meta']
+        return _start_local_analysis(saved, info['filename'], meta.get('weapon', ''), meta.get('lang', 'zh'),
+                                     meta.get('lane'))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _request_lang() -> str:
+    lang = (request.args.get('lang') or 'zh').strip().lower()
+    return lang if lang in ('zh', 'en', 'ja') else 'zh'
+
+
+def _job_status(job: dict, lang: str) -> dict:
+    """分析任务对外的状态字段（轮询与 SSE 推送共用）
+
+    附加到他人任务的请求方界面语言可能不同：完成后按请求语言读取结果（叠加翻译层）。
+    """
+    result = job.get('result') if job.get('status') == 'done' else None
+    if result and result.get('lang', 'zh') != lang:
+        result = local_video_processor.load_analysis(job['video_id'], lang) or result
+    return {
         'success': True,
         'status': job.get('status'),
         'progress': job.get('progress', 0),
         'step': job.get('step', ''),
         'error': job.get('error'),
-        'result': job.get('result') if job.get('status') == 'done' else None,
-    })
+        'result': result,
+        # 分析进行中已得到的关键时刻（分窗分析每完成一窗更新一次）
+        'partial': job.get('partial') if job.get('status') != 'done' else None,
+        # 排队中的位置（1 = 下一个执行，按所有 worker 进程的排队任务计算），已开始执行为 None
+        'queue_position': (analysis_scheduler.rank(job_store.queued_jobs(), job['job_id'])
+                           if job.get('status') == 'pending' else None),
+    }
+
+
+@app.route('/api/analyze_status/<job_id>', methods=['GET'])
+def analyze_status(job_id: str):
+    """轮询分析任务状态（不支持 EventSource 时的回退）"""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    return jsonify(_job_status(job, _request_lang()))
+
+
+# SSE 连接空闲时发送注释行保活的间隔（秒）；排队期间按较短间隔刷新排队位置
+JOB_EVENT_HEARTBEAT = 15
+JOB_EVENT_QUEUE_REFRESH = 2
+# 单个 SSE 连接的最长时长（秒）：到时发送 reconnect 事件后断开，由前端重新连接，
+# 长任务不会一直占着一个 worker 线程
+JOB_EVENT_MAX_LIFETIME = 300
+
+
+@app.route('/api/analyze_events/<job_id>', methods=['GET'])
+def analyze_events(job_id: str):
+    """SSE 推送分析任务进度：worker 每次 job_store.update 都会唤醒推送，done / error 后结束
+
+    每个连接在整个推送期间占用一个线程：gunicorn 需用 gthread / gevent worker（见 gunicorn.conf.py），
+    sync worker 会被长连接占满。连接超过 JOB_EVENT_MAX_LIFETIME 秒后通知前端重连。
+    """
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    lang = _request_lang()
+
+    def stream():
+        current = job
+        sent = None
+        deadline = time.time() + JOB_EVENT_MAX_LIFETIME
+        while True:
+            payload = _job_status(current, lang)
+            if payload != sent:
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                sent = payload
+            else:
+                yield ": keep-alive\n\n"
+            if current.get('status') in ('done', 'error'):
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                yield "event: reconnect\ndata: {}\n\n"
+                return
+            timeout = JOB_EVENT_QUEUE_REFRESH if current.get('status') == 'pending' else JOB_EVENT_HEARTBEAT
+            version = job_store.wait_for_update(job_id, current['version'], min(timeout, remaining))
+            if version is None:
+                yield f"data: {json.dumps({'success': False, 'error': '任务不存在或已过期'}, ensure_ascii=False)}\n\n"
+                return
+            if version != current['version']:
+                current = job_store.get(job_id) or current
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.route('/api/local_video/<video_id>')
 def serve_local_video(video_id: str):
     """流式返回本地视频文件（支持 Range 协议）"""
     from utils.local_video_processor import UPLOAD_DIR
-    # 找到对应文件
-    for ext in ('.mp4', '.mov', '.webm', '.avi', '.mkv', '.m4v'):
-        candidate = os.path.join(UPLOAD_DIR, f"{video_id}{ext}")
-        if os.path.exists(candidate):
-            return send_from_directory(
-                UPLOAD_DIR,
-                f"{video_id}{ext}",
-                conditional=True,  # 支持 Range
-            )
+    path = video_store.find(video_id)
+    if path:
+        return send_from_directory(
+            UPLOAD_DIR,
+            os.path.basename(path),
+            conditional=True,  # 支持 Range
+        )
     return jsonify({'error': '视频不存在'}), 404
 
 
 @app.route('/api/analysis/<video_id>', methods=['GET'])
 def get_analysis(video_id: str):
-    """获取已完成分析的结果（用于页面刷新后恢复）"""
-    data = local_video_processor.load_analysis(video_id)
+    """获取已完成分析的结果（用于页面刷新后恢复 / 切换界面语言）"""
+    data = local_video_processor.load_analysis(video_id, _request_lang())
     if not data:
         return jsonify({'error': '未找到分析结果'}), 404
     return jsonify({'success': True, 'analysis': data})
@@ -486,7 +675,7 @@ def get_analysis(video_id: str):
 # ============================================================
 @app.errorhandler(413)
 def too_large(e):
-    return jsonify({'error': '文件超过 100MB 限制'}), 413
+    return jsonify({'error': '请求超过 100MB 限制，大文件请使用分片上传'}), 413
 
 
 @app.route('/api/knowledge_recommend', methods=['POST'])
@@ -509,4 +698,7 @@ def knowledge_recommend():
 
 
 if __name__ == '__main__':
+    # debug 默认开启 reloader，只在提供服务的子进程里恢复任务
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        local_video_processor.recover_jobs()
     app.run(debug=True, host='0.0.0.0', port=8888)
@@ -29,6 +29,68 @@ class Config:
     MINIMAX_TEMPERATURE = float(os.getenv('MINIMAX_TEMPERATURE', '0.7'))
     MINIMAX_BASE_URL = os.getenv('MINIMAX_BASE_URL', 'https://api.minimaxi.com/v1')
     
+    # 视频理解配置
+    # M3 对视频按 VIDEO_SAMPLE_FPS 均匀抽帧；大视频压缩时默认（lowfps）直接按同一帧率重编码，
+    # 设为 full 则保留原帧率
+    VIDEO_SAMPLE_FPS = float(os.getenv('VIDEO_SAMPLE_FPS', '1'))
+    VIDEO_COMPRESS_MODE = os.getenv('VIDEO_COMPRESS_MODE', 'lowfps')
+    # 视频理解请求使用流式（SSE）输出，关键时刻边生成边展示
+    VISION_STREAM = os.getenv('VISION_STREAM', 'True').lower() == 'true'
+    # 转码后端：process（独立进程池，不占 Flask 进程的 GIL/CPU）或 inline（在分析线程里直接转码）
+    TRANSCODE_BACKEND = os.getenv('TRANSCODE_BACKEND', 'process')
+    TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+    # 进程池满时最多排队的转码任务数，再多则提交方阻塞等待
+    TRANSCODE_QUEUE_SIZE = int(os.getenv('TRANSCODE_QUEUE_SIZE', '16'))
+    # 压缩代理缓存上限（MB），超出按最近最少使用淘汰
+    PROXY_CACHE_MAX_MB = int(os.getenv('PROXY_CACHE_MAX_MB', '2048'))
+    # 长视频分窗分析：超过 VISION_WINDOW_THRESHOLD 秒（0 关闭）按 VISION_WINDOW_SEC 秒一窗、
+    # 相邻重叠 VISION_WINDOW_OVERLAP 秒切开，最多 VISION_PARALLELISM 个窗同时调用 M3
+    VISION_WINDOW_THRESHOLD = float(os.getenv('VISION_WINDOW_THRESHOLD', '150'))
+    VISION_WINDOW_SEC = float(os.getenv('VISION_WINDOW_SEC', '75'))
+    VISION_WINDOW_OVERLAP = float(os.getenv('VISION_WINDOW_OVERLAP', '5'))
+    VISION_PARALLELISM = int(os.getenv('VISION_PARALLELISM', '3'))
+    # 分析任务调度：同时运行的分析任务数与等待队列长度（队列满时上传接口返回 429）
+    # interactive（页面上传）与 batch（批量导入）分道排队：batch 队列单独限长，
+    # 且最多占用 ANALYSIS_WORKERS - ANALYSIS_INTERACTIVE_RESERVED 个线程；
+    # 同道内按时长 × 分辨率从小到大执行，每等待 1 秒优先级提升 ANALYSIS_AGING_RATE（720p 秒）；
+    # 线程数与队列长度都是每个进程的限制，gunicorn 多 worker 时总量按 worker 数成倍增加
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '2'))
+    ANALYSIS_QUEUE_SIZE = int(os.getenv('ANALYSIS_QUEUE_SIZE', '8'))
+    ANALYSIS_BATCH_QUEUE_SIZE = int(os.getenv('ANALYSIS_BATCH_QUEUE_SIZE', '32'))
+    ANALYSIS_INTERACTIVE_RESERVED = int(os.getenv('ANALYSIS_INTERACTIVE_RESERVED', '1'))
+    ANALYSIS_AGING_RATE = float(os.getenv('ANALYSIS_AGING_RATE', '1'))
+
+    # 分析任务状态存储：sqlite（data/jobs.db，多 worker 共享、重启可恢复）或 memory（进程内）
+    JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'sqlite')
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs.db'))
+    # 已结束任务保留秒数；持有任务的进程超过 JOB_OWNER_LEASE 秒没有心跳视为已退出，任务可被认领；
+    # 升级前写入的旧格式任务（没有心跳）超过 JOB_STALE_TIMEOUT 秒无更新视为已中断
+    JOB_TTL = int(os.getenv('JOB_TTL', '3600'))
+    JOB_OWNER_LEASE = float(os.getenv('JOB_OWNER_LEASE', '60'))
+    JOB_STALE_TIMEOUT = float(os.getenv('JOB_STALE_TIMEOUT', '900'))
+
+    # 翻译记忆：模型译出的短语存 SQLite（多 worker 共享），超过上限按最近使用时间淘汰
+    TRANSLATION_MEMORY_PATH = os.getenv('TRANSLATION_MEMORY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'translation_memory.db'))
+    TRANSLATION_MEMORY_MAX_ENTRIES = int(os.getenv('TRANSLATION_MEMORY_MAX_ENTRIES', '5000'))
+
+    # 出站 HTTP 连接池（每个主机一个池，keep-alive 复用）与超时（秒）
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_CHAT_TIMEOUT = float(os.getenv('HTTP_CHAT_TIMEOUT', '30'))
+    HTTP_VISION_TIMEOUT = float(os.getenv('HTTP_VISION_TIMEOUT', '300'))
+    HTTP_TRANSLATE_TIMEOUT = float(os.getenv('HTTP_TRANSLATE_TIMEOUT', '120'))
+    HTTP_SCRAPE_TIMEOUT = float(os.getenv('HTTP_SCRAPE_TIMEOUT', '10'))
+    HTTP_PROBE_TIMEOUT = float(os.getenv('HTTP_PROBE_TIMEOUT', '5'))
+
+    # 提供商熔断与重试：连续失败 N 次打开熔断，后台每隔 HEALTH_PROBE_INTERVAL 秒探测恢复；
+    # 重试间隔为全抖动指数退避 uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^n))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+    BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '60'))
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '10'))
+    RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '1'))
+    RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '10'))
+    LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '2'))
+
     # AI系统配置
     LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'deepseek')
     FALLBACK_TO_LOCAL = os.getenv('FALLBACK_TO_LOCAL', 'True').lower() == 'true'
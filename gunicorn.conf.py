@@ -0,0 +1,19 @@
+"""
+gunicorn 配置（gunicorn app:app 时自动加载）
+
+- worker_class / threads：/api/analyze_events 是 SSE 长连接，每个连接占用一个线程，
+  sync worker 会被几个进度页面占满；默认 gthread，也可以 GUNICORN_WORKER_CLASS=gevent
+- post_worker_init：每个 worker 加载完应用后恢复上次中断的分析任务（多个 worker 同时认领时
+  每个任务只会被一个 worker 拿到，见 SQLiteJobStore.claim_orphans）；不在 app 导入时执行，
+  否则 preload 的 master 进程和 spawn 出的转码子进程也会去认领任务
+"""
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+
+def post_worker_init(worker):
+    from app import local_video_processor
+
+    local_video_processor.recover_jobs()
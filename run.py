@@ -6,7 +6,7 @@
 
 import os
 import sys
-from app import app
+from app import app, local_video_processor
 
 def main():
     """主函数"""
@@ -33,6 +33,11 @@ def main():
     os.environ.setdefault('FLASK_ENV', 'development')
     os.environ.setdefault('FLASK_DEBUG', 'True')
     
+    use_reloader = True
+    # 重载模式下只有真正提供服务的子进程（WERKZEUG_RUN_MAIN=true）恢复中断的分析任务，监视文件的父进程不恢复
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        local_video_processor.recover_jobs()
+
     print("🚀 启动Flask应用...")
     print("📱 访问地址: http://localhost:8888")
     print("🛑 按 Ctrl+C 停止应用")
@@ -44,7 +49,7 @@ def main():
             host='0.0.0.0',
             port=8888,
             debug=True,
-            use_reloader=True
+            use_reloader=use_reloader
         )
     except KeyboardInterrupt:
         print("\n🛑 应用已停止")
@@ -899,6 +899,10 @@
                 '文件过大': '文件过大',
                 '请使用': '请使用',
                 '最大支持': '最大支持',
+                '校验文件': '校验文件',
+                '已分析部分': '已分析部分',
+                '排队中，前面还有': '排队中，前面还有',
+                '个任务': '个任务',
                 '自动生成': '自动生成',
                 '停止生成': '停止生成',
                 '发送弹幕失败:': '发送弹幕失败:',
@@ -964,6 +968,10 @@
                 '文件过大': 'File too large',
                 '请使用': 'Please use',
                 '最大支持': 'Maximum allowed',
+                '校验文件': 'Verifying file',
+                '已分析部分': 'Partial results',
+                '排队中，前面还有': 'Queued,',
+                '个任务': 'ahead',
                 '自动生成': 'Auto Generate',
                 '停止生成': 'Stop Generating',
                 '发送弹幕失败:': 'Failed to send danmaku: ',
@@ -1028,6 +1036,10 @@
                 '文件过大': 'ファイルが大きすぎます',
                 '请使用': '次の形式を使用してください',
                 '最大支持': '最大サイズ',
+                '校验文件': 'ファイル検証中',
+                '已分析部分': '途中結果',
+                '排队中，前面还有': '待機中、前のジョブ',
+                '个任务': '件',
                 '自动生成': '自動生成',
                 '停止生成': '生成停止',
                 '发送弹幕失败:': '弾幕送信失敗: ',
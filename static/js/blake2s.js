@@ -0,0 +1,98 @@
+/**
+ * 增量 BLAKE2s（与后端 hashlib.blake2s(digest_size=8) 一致），用于上传前的内容指纹
+ */
+const B2S_IV = [0x6A09E667, 0xBB67AE85, 0x3C6EF372, 0xA54FF53A, 0x510E527F, 0x9B05688C, 0x1F83D9AB, 0x5BE0CD19];
+const B2S_SIGMA = Uint8Array.from([
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    14, 10, 4, 8, 9, 15, 13, 6, 1, 12, 0, 2, 11, 7, 5, 3,
+    11, 8, 12, 0, 5, 2, 15, 13, 10, 14, 3, 6, 7, 1, 9, 4,
+    7, 9, 3, 1, 13, 12, 11, 14, 2, 6, 5, 10, 4, 0, 15, 8,
+    9, 0, 5, 7, 2, 4, 10, 15, 14, 1, 11, 12, 6, 8, 3, 13,
+    2, 12, 6, 10, 0, 11, 8, 3, 4, 13, 7, 5, 15, 14, 1, 9,
+    12, 5, 1, 15, 14, 13, 4, 10, 0, 7, 6, 3, 9, 2, 8, 11,
+    13, 11, 7, 14, 12, 1, 3, 9, 5, 0, 15, 4, 8, 6, 2, 10,
+    6, 15, 14, 9, 11, 3, 0, 8, 12, 2, 13, 7, 1, 4, 10, 5,
+    10, 2, 8, 4, 7, 6, 1, 5, 15, 11, 9, 14, 3, 12, 13, 0,
+]);
+
+class Blake2s {
+    constructor(outLen = 8) {
+        this.outLen = outLen;
+        this.h = Int32Array.from(B2S_IV);
+        this.h[0] ^= 0x01010000 ^ outLen;
+        this.buf = new Uint8Array(64);
+        this.bufLen = 0;
+        this.t = 0;                 // 已压缩字节数（< 2^53 足够）
+        this.m = new Int32Array(16);
+    }
+
+    update(data) {
+        let i = 0;
+        const n = data.length;
+        // 先补满缓冲区；最后一块必须留给 hexdigest 带结束标志压缩
+        if (this.bufLen > 0) {
+            const k = Math.min(64 - this.bufLen, n);
+            this.buf.set(data.subarray(0, k), this.bufLen);
+            this.bufLen += k;
+            i = k;
+            if (this.bufLen < 64 || i === n) return this;
+            this.t += 64;
+            this._compress(this.buf, 0, false);
+            this.bufLen = 0;
+        }
+        // 中间整块直接从输入压缩，不复制
+        while (n - i > 64) {
+            this.t += 64;
+            this._compress(data, i, false);
+            i += 64;
+        }
+        this.buf.set(data.subarray(i), 0);
+        this.bufLen = n - i;
+        return this;
+    }
+
+    hexdigest() {
+        this.t += this.bufLen;
+        this.buf.fill(0, this.bufLen);
+        this._compress(this.buf, 0, true);
+        let hex = '';
+        for (let i = 0; i < this.outLen; i++) {
+            hex += ((this.h[i >> 2] >>> (8 * (i & 3))) & 0xff).toString(16).padStart(2, '0');
+        }
+        return hex;
+    }
+
+    _compress(src, off, last) {
+        const m = this.m, h = this.h, s = B2S_SIGMA;
+        for (let i = 0; i < 16; i++, off += 4) {
+            m[i] = src[off] | (src[off + 1] << 8) | (src[off + 2] << 16) | (src[off + 3] << 24);
+        }
+        let v0 = h[0], v1 = h[1], v2 = h[2], v3 = h[3], v4 = h[4], v5 = h[5], v6 = h[6], v7 = h[7];
+        let v8 = B2S_IV[0], v9 = B2S_IV[1], v10 = B2S_IV[2], v11 = B2S_IV[3];
+        let v12 = B2S_IV[4] ^ this.t, v13 = B2S_IV[5] ^ Math.floor(this.t / 0x100000000);
+        let v14 = last ? ~B2S_IV[6] : B2S_IV[6], v15 = B2S_IV[7];
+        // 10 轮，每轮 8 次 G 混合（列 4 次 + 对角 4 次）
+        for (let r = 0; r < 160; r += 16) {
+            v0 = (v0 + v4 + m[s[r]]) | 0; v12 ^= v0; v12 = (v12 >>> 16) | (v12 << 16); v8 = (v8 + v12) | 0; v4 ^= v8; v4 = (v4 >>> 12) | (v4 << 20);
+            v0 = (v0 + v4 + m[s[r + 1]]) | 0; v12 ^= v0; v12 = (v12 >>> 8) | (v12 << 24); v8 = (v8 + v12) | 0; v4 ^= v8; v4 = (v4 >>> 7) | (v4 << 25);
+            v1 = (v1 + v5 + m[s[r + 2]]) | 0; v13 ^= v1; v13 = (v13 >>> 16) | (v13 << 16); v9 = (v9 + v13) | 0; v5 ^= v9; v5 = (v5 >>> 12) | (v5 << 20);
+            v1 = (v1 + v5 + m[s[r + 3]]) | 0; v13 ^= v1; v13 = (v13 >>> 8) | (v13 << 24); v9 = (v9 + v13) | 0; v5 ^= v9; v5 = (v5 >>> 7) | (v5 << 25);
+            v2 = (v2 + v6 + m[s[r + 4]]) | 0; v14 ^= v2; v14 = (v14 >>> 16) | (v14 << 16); v10 = (v10 + v14) | 0; v6 ^= v10; v6 = (v6 >>> 12) | (v6 << 20);
+            v2 = (v2 + v6 + m[s[r + 5]]) | 0; v14 ^= v2; v14 = (v14 >>> 8) | (v14 << 24); v10 = (v10 + v14) | 0; v6 ^= v10; v6 = (v6 >>> 7) | (v6 << 25);
+            v3 = (v3 + v7 + m[s[r + 6]]) | 0; v15 ^= v3; v15 = (v15 >>> 16) | (v15 << 16); v11 = (v11 + v15) | 0; v7 ^= v11; v7 = (v7 >>> 12) | (v7 << 20);
+            v3 = (v3 + v7 + m[s[r + 7]]) | 0; v15 ^= v3; v15 = (v15 >>> 8) | (v15 << 24); v11 = (v11 + v15) | 0; v7 ^= v11; v7 = (v7 >>> 7) | (v7 << 25);
+            v0 = (v0 + v5 + m[s[r + 8]]) | 0; v15 ^= v0; v15 = (v15 >>> 16) | (v15 << 16); v10 = (v10 + v15) | 0; v5 ^= v10; v5 = (v5 >>> 12) | (v5 << 20);
+            v0 = (v0 + v5 + m[s[r + 9]]) | 0; v15 ^= v0; v15 = (v15 >>> 8) | (v15 << 24); v10 = (v10 + v15) | 0; v5 ^= v10; v5 = (v5 >>> 7) | (v5 << 25);
+            v1 = (v1 + v6 + m[s[r + 10]]) | 0; v12 ^= v1; v12 = (v12 >>> 16) | (v12 << 16); v11 = (v11 + v12) | 0; v6 ^= v11; v6 = (v6 >>> 12) | (v6 << 20);
+            v1 = (v1 + v6 + m[s[r + 11]]) | 0; v12 ^= v1; v12 = (v12 >>> 8) | (v12 << 24); v11 = (v11 + v12) | 0; v6 ^= v11; v6 = (v6 >>> 7) | (v6 << 25);
+            v2 = (v2 + v7 + m[s[r + 12]]) | 0; v13 ^= v2; v13 = (v13 >>> 16) | (v13 << 16); v8 = (v8 + v13) | 0; v7 ^= v8; v7 = (v7 >>> 12) | (v7 << 20);
+            v2 = (v2 + v7 + m[s[r + 13]]) | 0; v13 ^= v2; v13 = (v13 >>> 8) | (v13 << 24); v8 = (v8 + v13) | 0; v7 ^= v8; v7 = (v7 >>> 7) | (v7 << 25);
+            v3 = (v3 + v4 + m[s[r + 14]]) | 0; v14 ^= v3; v14 = (v14 >>> 16) | (v14 << 16); v9 = (v9 + v14) | 0; v4 ^= v9; v4 = (v4 >>> 12) | (v4 << 20);
+            v3 = (v3 + v4 + m[s[r + 15]]) | 0; v14 ^= v3; v14 = (v14 >>> 8) | (v14 << 24); v9 = (v9 + v14) | 0; v4 ^= v9; v4 = (v4 >>> 7) | (v4 << 25);
+        }
+        h[0] ^= v0 ^ v8; h[1] ^= v1 ^ v9; h[2] ^= v2 ^ v10; h[3] ^= v3 ^ v11;
+        h[4] ^= v4 ^ v12; h[5] ^= v5 ^ v13; h[6] ^= v6 ^ v14; h[7] ^= v7 ^ v15;
+    }
+}
+
+window.Blake2s = Blake2s;
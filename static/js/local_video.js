@@ -3,16 +3,21 @@
  *
  * 流程：
  * 1. 用户点击"本地视频"按钮 → 弹出文件选择器
- * 2. 选择文件后校验大小/格式 → POST /api/upload_video
+ * 2. 选择文件后校验大小/格式 → 算内容哈希 POST /api/upload_precheck（已有则不再上传）
+ *    → POST /api/upload_video
+ *    （大文件走 /api/upload_chunked 分片上传：并行分片、单片重试、刷新页面后可续传）
  * 3. 进度模态框显示：上传 → 抽帧 → AI 分析
- * 4. 轮询 /api/analyze_status/<job_id> 获取进度
+ * 4. 通过 SSE /api/analyze_events/<job_id> 接收进度推送（不可用时轮询 /api/analyze_status/<job_id>）
  * 5. 完成后：
  *    - 用 <video> 替换 #video-player 内的内容，src 指向 /api/local_video/<video_id>
  *    - 渲染 #analysis-panel（summary + 关键时刻 + 动作）
  *    - 注入聊天上下文（视频摘要会作为 system context 传给 AI）
  * 6. 关键时刻点击 → 跳转视频到该时间
  */
-const MAX_FILE_SIZE = 100 * 1024 * 1024; // 100MB
+const MAX_FILE_SIZE = 512 * 1024 * 1024; // 512MB（与后端 MAX_FILE_SIZE 一致）
+const CHUNKED_THRESHOLD = 32 * 1024 * 1024; // 超过 32MB 走分片上传
+const CHUNK_PARALLEL = 3;                   // 同时上传的分片数
+const CHUNK_RETRIES = 4;                    // 单个分片最多重试次数
 const ALLOWED_EXT = ['mp4', 'mov', 'webm', 'avi', 'mkv', 'm4v'];
 
 class LocalVideoSystem {
@@ -20,7 +25,8 @@ class LocalVideoSystem {
         this.videoId = null;
         this.analysis = null;
         this.videoEl = null;       // 当前 <video> 元素
-        this.polling = null;        // 进度轮询定时器
+        this.polling = null;        // 进度轮询定时器（SSE 不可用时）
+        this.events = null;         // 进度推送 EventSource
         this.uploadedFilename = '';
         this._contextKey = null;    // 注入聊天时使用的唯一 key
     }
@@ -32,6 +38,22 @@ class LocalVideoSystem {
         if (btn) btn.addEventListener('click', () => input?.click());
         if (input) input.addEventListener('change', (e) => this._onFileChosen(e));
         if (cancelBtn) cancelBtn.addEventListener('click', () => this.hideProgress());
+        window.addEventListener('languageChanged', (e) => this._reloadAnalysis(e.detail?.lang));
+    }
+
+    // 切换界面语言：取该语言的分析（服务器缓存翻译层，不会重新分析视频）
+    async _reloadAnalysis(lang) {
+        if (!this.videoId || !this.analysis || this.analysis.partial || !lang) return;
+        try {
+            const r = await fetch(`/api/analysis/${this.videoId}?lang=${encodeURIComponent(lang)}`);
+            const data = await r.json();
+            if (!r.ok || !data.success) return;
+            this.analysis = data.analysis;
+            this._renderAnalysisPanel();
+            this._injectChatContext();
+        } catch (e) {
+            // 保留当前语言的结果
+        }
     }
 
     // ----------------------------------------------------------
@@ -47,7 +69,7 @@ class LocalVideoSystem {
             return;
         }
         if (file.size > MAX_FILE_SIZE) {
-            alert(`${window.t('文件过大')}（${(file.size/1024/1024).toFixed(1)}MB），${window.t('最大支持')} 100MB`);
+            alert(`${window.t('文件过大')}（${(file.size/1024/1024).toFixed(1)}MB），${window.t('最大支持')} 512MB`);
             return;
         }
         this._uploadAndAnalyze(file);
@@ -60,18 +82,27 @@ class LocalVideoSystem {
         const weaponSel = document.getElementById('weapon-select');
         const weapon = weaponSel?.value || 'auto';
 
-        const fd = new FormData();
-        fd.append('video', file);
-        if (weapon && weapon !== 'auto') fd.append('weapon', weapon);
         // 带上当前 UI 语言，让 M3 输出对应语言的分析文本
         const curLang = localStorage.getItem('fencing_ai_lang') || 'zh';
-        fd.append('lang', curLang);
+        const onProgress = (pct) => {
+            this.showProgress(Math.min(40, pct * 0.4), '上传中...', file.name);
+        };
 
         try {
-            // 用 XHR 拿上传进度
-            const data = await this._xhrUpload('/api/upload_video', fd, (pct) => {
-                this.showProgress(Math.min(40, pct * 0.4), '上传中...', file.name);
-            });
+            // 预检：先算内容哈希，服务器已有该视频（及分析）时跳过上传
+            let data = await this._precheck(file, weapon, curLang);
+            if (data) {
+                onProgress(100);
+            } else if (file.size > CHUNKED_THRESHOLD) {
+                data = await this._chunkedUpload(file, weapon, curLang, onProgress);
+            } else {
+                const fd = new FormData();
+                fd.append('video', file);
+                if (weapon && weapon !== 'auto') fd.append('weapon', weapon);
+                fd.append('lang', curLang);
+                // 用 XHR 拿上传进度
+                data = await this._xhrUpload('/api/upload_video', fd, onProgress);
+            }
 
             if (!data.success) {
                 this.showProgress(0, `失败：${data.error || '未知错误'}`, file.name);
@@ -125,43 +156,215 @@ class LocalVideoSystem {
         });
     }
 
+    // ----------------------------------------------------------
+    // 上传前预检：BLAKE2s 内容哈希即服务器端 video_id
+    // ----------------------------------------------------------
+    async _precheck(file, weapon, lang) {
+        if (!window.Blake2s) return null;
+        try {
+            const hash = await this._hashFile(file, (pct) => {
+                this.showProgress(0, `${window.t('校验文件')}... ${Math.round(pct)}%`, file.name);
+            });
+            const r = await fetch('/api/upload_precheck', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    hash,
+                    filename: file.name,
+                    weapon: weapon && weapon !== 'auto' ? weapon : '',
+                    lang,
+                }),
+            });
+            const data = await r.json();
+            // 视频已在服务器但分析队列已满：直接提示，不再重新上传
+            if (r.status === 429) return data;
+            return r.ok && data.success && data.exists ? data : null;
+        } catch (e) {
+            return null;  // 预检失败不影响正常上传
+        }
+    }
+
+    async _hashFile(file, onProgress) {
+        const h = new window.Blake2s(8);
+        const step = 4 * 1024 * 1024;
+        for (let pos = 0; pos < file.size; pos += step) {
+            const buf = await file.slice(pos, Math.min(file.size, pos + step)).arrayBuffer();
+            h.update(new Uint8Array(buf));
+            if (onProgress) onProgress((Math.min(file.size, pos + step) / file.size) * 100);
+        }
+        return h.hexdigest();
+    }
+
+    // ----------------------------------------------------------
+    // 分片上传：init → 并行 PUT 分片 → finalize
+    // upload_id 记在 localStorage，刷新页面后同一文件只补传缺失区间
+    // ----------------------------------------------------------
+    async _chunkedUpload(file, weapon, lang, onProgress) {
+        const resumeKey = `fencing_upload_${file.name}_${file.size}_${file.lastModified}`;
+        let session = null;
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            try {
+                const r = await fetch(`/api/upload_chunked/${savedId}`);
+                if (r.ok) session = await r.json();
+            } catch (e) { /* 会话失效则重新 init */ }
+        }
+        if (!session || !session.success) {
+            const r = await fetch('/api/upload_chunked/init', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    filename: file.name,
+                    size: file.size,
+                    weapon: weapon && weapon !== 'auto' ? weapon : '',
+                    lang,
+                }),
+            });
+            session = await r.json();
+            if (!r.ok || !session.success) throw new Error(session.error || `HTTP ${r.status}`);
+            localStorage.setItem(resumeKey, session.upload_id);
+        }
+
+        const uploadId = session.upload_id;
+        const chunkSize = session.chunk_size || 8 * 1024 * 1024;
+        const pending = this._missingChunks(session.ranges || [], file.size, chunkSize);
+        let done = file.size - pending.reduce((n, [s, e]) => n + (e - s), 0);
+        onProgress((done / file.size) * 100);
+
+        const worker = async () => {
+            while (pending.length) {
+                const [start, end] = pending.shift();
+                await this._putChunk(uploadId, file.slice(start, end), start);
+                done += end - start;
+                onProgress((done / file.size) * 100);
+            }
+        };
+        await Promise.all(Array.from({ length: CHUNK_PARALLEL }, worker));
+
+        const r = await fetch(`/api/upload_chunked/${uploadId}/finalize`, { method: 'POST' });
+        const data = await r.json();
+        if (!r.ok) throw new Error(data.error || `HTTP ${r.status}`);
+        localStorage.removeItem(resumeKey);
+        return data;
+    }
+
+    _missingChunks(ranges, size, chunkSize) {
+        // 已收到区间的补集，再按 chunkSize 切片
+        const gaps = [];
+        let pos = 0;
+        for (const [s, e] of ranges) {
+            if (s > pos) gaps.push([pos, s]);
+            pos = Math.max(pos, e);
+        }
+        if (pos < size) gaps.push([pos, size]);
+        const chunks = [];
+        for (const [s, e] of gaps) {
+            for (let p = s; p < e; p += chunkSize) chunks.push([p, Math.min(e, p + chunkSize)]);
+        }
+        return chunks;
+    }
+
+    async _putChunk(uploadId, blob, offset) {
+        let lastErr = null;
+        for (let attempt = 0; attempt < CHUNK_RETRIES; attempt++) {
+            try {
+                const r = await fetch(`/api/upload_chunked/${uploadId}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: blob,
+                });
+                if (r.ok) return;
+                const data = await r.json().catch(() => ({}));
+                lastErr = new Error(data.error || `HTTP ${r.status}`);
+                if (r.status === 400 || r.status === 404) break;  // 不可重试
+            } catch (e) {
+                lastErr = e;  // 网络错误：退避后重试
+            }
+            await new Promise(res => setTimeout(res, 1000 * 2 ** attempt));
+        }
+        throw lastErr || new Error('分片上传失败');
+    }
+
     _pollJob(jobId) {
-        if (this.polling) clearInterval(this.polling);
+        this._stopJobWatch();
+        this._partialCount = 0;
+        // 带上界面语言：附加到他人发起的同一视频任务时，结果按自己的语言返回
+        this._jobLang = localStorage.getItem('fencing_ai_lang') || 'zh';
+        // 优先用 SSE 接收服务端推送；浏览器不支持或连接失败时退回轮询
+        if (window.EventSource) {
+            const es = new EventSource(`/api/analyze_events/${jobId}?lang=${this._jobLang}`);
+            this.events = es;
+            es.onmessage = (e) => {
+                let data;
+                try { data = JSON.parse(e.data); } catch (err) { return; }
+                if (this._handleJobStatus(data)) this._stopJobWatch();
+            };
+            es.addEventListener('reconnect', () => {
+                // 服务端单个连接达到时长上限后主动断开：重新建立连接继续接收
+                if (this.events !== es) return;
+                this._pollJob(jobId);
+            });
+            es.onerror = () => {
+                // 服务端在任务结束后关闭连接；未结束时断开则改为轮询，避免 EventSource 无限重连
+                if (this.events !== es) return;
+                this._stopJobWatch();
+                this._startPolling(jobId);
+            };
+            return;
+        }
+        this._startPolling(jobId);
+    }
+
+    _startPolling(jobId) {
         this.polling = setInterval(async () => {
             try {
-                const r = await fetch(`/api/analyze_status/${jobId}`);
+                const r = await fetch(`/api/analyze_status/${jobId}?lang=${this._jobLang}`);
                 const data = await r.json();
-                if (!data.success) {
-                    this.showProgress(0, `任务异常：${data.error || '未知'}`, this.uploadedFilename);
-                    clearInterval(this.polling);
-                    this.polling = null;
-                    return;
-                }
-                // 把"分析"阶段映射到 45-100%
-                const pct = 45 + (data.progress || 0) * 0.55;
-                this.showProgress(pct, data.step || '处理中...', this.uploadedFilename);
-
-                if (data.status === 'done') {
-                    clearInterval(this.polling);
-                    this.polling = null;
-                    this.analysis = data.result;
-                    setTimeout(() => {
-                        this.hideProgress();
-                        this._renderLocalPlayer();
-                        this._renderAnalysisPanel();
-                        this._injectChatContext();
-                    }, 400);
-                } else if (data.status === 'error') {
-                    clearInterval(this.polling);
-                    this.polling = null;
-                    this.showProgress(0, `分析失败：${data.error || ''}`, this.uploadedFilename);
-                }
+                if (this._handleJobStatus(data)) this._stopJobWatch();
             } catch (e) {
                 // 网络抖动继续轮询
             }
         }, 1500);
     }
 
+    _stopJobWatch() {
+        if (this.polling) clearInterval(this.polling);
+        this.polling = null;
+        if (this.events) this.events.close();
+        this.events = null;
+    }
+
+    // 处理一次任务状态（SSE 推送或轮询结果）；任务结束返回 true
+    _handleJobStatus(data) {
+        if (!data.success) {
+            this.showProgress(0, `任务异常：${data.error || '未知'}`, this.uploadedFilename);
+            return true;
+        }
+        // 把"分析"阶段映射到 45-100%
+        const pct = 45 + (data.progress || 0) * 0.55;
+        const step = data.queue_position
+            ? `${window.t('排队中，前面还有')} ${data.queue_position - 1} ${window.t('个任务')}`
+            : (data.step || '处理中...');
+        this.showProgress(pct, step, this.uploadedFilename);
+        if (data.partial) this._renderPartial(data.partial);
+
+        if (data.status === 'done') {
+            this.analysis = data.result;
+            setTimeout(() => {
+                this.hideProgress();
+                this._renderLocalPlayer();
+                this._renderAnalysisPanel();
+                this._injectChatContext();
+            }, 400);
+            return true;
+        }
+        if (data.status === 'error') {
+            this.showProgress(0, `分析失败：${data.error || ''}`, this.uploadedFilename);
+            return true;
+        }
+        return false;
+    }
+
     // ----------------------------------------------------------
     // 进度模态
     // ----------------------------------------------------------
@@ -183,9 +386,30 @@ class LocalVideoSystem {
     // ----------------------------------------------------------
     // 渲染本地播放器（替换 YouTube 区域）
     // ----------------------------------------------------------
+    // ----------------------------------------------------------
+    // 分析进行中：已完成的时间窗 / 已解析出的关键时刻先渲染出来
+    // ----------------------------------------------------------
+    _renderPartial(partial) {
+        const moments = partial.key_moments || [];
+        if (!moments.length || moments.length === this._partialCount) return;
+        this._partialCount = moments.length;
+        const progress = partial.total ? ` ${partial.done}/${partial.total}` : '';
+        this.analysis = {
+            video_id: this.videoId,
+            key_moments: moments,
+            actions: partial.actions || [],
+            summary: `${window.t('已分析部分')}${progress}…`,
+            partial: true,
+        };
+        this._renderLocalPlayer();
+        this._renderAnalysisPanel();
+    }
+
     _renderLocalPlayer() {
         const container = document.getElementById('video-player');
         if (!container || !this.videoId) return;
+        // 已在播放同一视频（分析过程中先渲染过）时不重建，避免打断播放
+        if (this.videoEl && this.videoEl.isConnected && this.videoEl.dataset.videoId === this.videoId) return;
 
         container.innerHTML = '';
         const v = document.createElement('video');
@@ -195,6 +419,7 @@ class LocalVideoSystem {
         v.preload = 'metadata';
         v.playsInline = true;
         v.src = `/api/local_video/${this.videoId}`;
+        v.dataset.videoId = this.videoId;
         v.style.width = '100%';
         v.style.height = '100%';
         v.style.objectFit = 'contain';
@@ -0,0 +1,40 @@
+"""video_transcoder：输出尺寸必须是偶数，奇数边的源也能转码"""
+import av
+import pytest
+
+from utils.video_transcoder import plan_compression, scaled_size, transcode_video
+
+
+def _make_source(path, width, height, frames=10, fps=10):
+    # rawvideo/rgb24 不要求偶数尺寸，能造出奇数边的源
+    with av.open(str(path), "w") as container:
+        stream = container.add_stream("rawvideo", rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, "rgb24"
+        for i in range(frames):
+            frame = av.VideoFrame(width, height, "rgb24")
+            frame.pts = i
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+@pytest.mark.parametrize("size", [(853, 480), (480, 853), (1279, 720), (1281, 721), (3, 3)])
+def test_scaled_size_is_even(size):
+    for long_edge in (1280, 960, 640, max(size)):
+        w, h = scaled_size(*size, long_edge=min(long_edge, max(size)))
+        assert w % 2 == 0 and h % 2 == 0
+        assert w <= max(size[0], 2) and h <= max(size[1], 2)
+
+
+@pytest.mark.parametrize("size", [(853, 480), (480, 853), (1279, 720)])
+def test_transcode_odd_source(tmp_path, size):
+    src, dst = tmp_path / "src.avi", tmp_path / "out.mp4"
+    _make_source(src, *size)
+    profile = plan_compression({"width": size[0], "height": size[1], "duration": 1.0, "fps": 10.0},
+                               4 * 1024 * 1024)
+    assert profile["width"] % 2 == 0 and profile["height"] % 2 == 0
+    assert transcode_video(str(src), str(dst), profile) > 0
+    with av.open(str(dst)) as container:
+        stream = container.streams.video[0]
+        assert (stream.width, stream.height) == (profile["width"], profile["height"])
@@ -0,0 +1,20 @@
+"""vision_windows：切窗后各窗负责区间首尾相接，覆盖整个视频"""
+import pytest
+
+from utils.vision_windows import plan_windows, window_bounds
+
+
+@pytest.mark.parametrize("duration", [151.0, 400.0, 1234.5, 3600.0])
+@pytest.mark.parametrize("grid", [None, 1.0, 0.5, 2.0 / 3])
+def test_window_ownership_covers_duration(duration, grid):
+    window, overlap = 120.0, 10.0
+    windows = plan_windows(duration, window, overlap, grid=grid)
+    assert windows[0][0] == 0.0 and windows[-1][1] == duration
+    bounds = [window_bounds(windows, i, overlap) for i in range(len(windows))]
+    assert bounds[0][0] == float("-inf") and bounds[-1][1] == float("inf")
+    for (start, end), (_, next_end), (_, own_hi), (next_lo, _) in zip(windows, windows[1:], bounds, bounds[1:]):
+        assert own_hi == next_lo  # 没有空隙，也不重复负责
+        assert start <= own_hi - overlap / 2 and own_hi <= end  # 负责区间落在窗内
+    for i, (start, end) in enumerate(windows):
+        own_lo, own_hi = bounds[i]
+        assert max(own_lo, 0.0) >= start and min(own_hi, duration) <= end
@@ -0,0 +1,245 @@
+"""
+分析任务调度 - 固定数量的分析线程 + 按优先级分道的有界等待队列
+
+每个上传都开一个线程时，一波突发上传就是同样数量的并发转码和 40MB+ 的 M3 请求，
+内存和 CPU 一起被打满。改为：
+- ANALYSIS_WORKERS 个常驻工作线程
+- 两条队列（lane）：interactive（用户上传后在页面上等结果）与 batch（批量导入 / 复盘），
+  各自有长度上限，满了 submit 直接抛 QueueFull，由接口返回 429
+  （视频已落盘，稍后重试走预检不必重新上传）
+- 空闲线程总是先取 interactive；batch 最多占用 workers - ANALYSIS_INTERACTIVE_RESERVED 个线程，
+  留出的线程只跑 interactive，批量任务再多也不会挡住教练现场等的短片
+- 同一条队列内按估算成本（时长 × 分辨率，折算成 720p 秒数）从小到大执行；
+  每等待 1 秒成本减去 ANALYSIS_AGING_RATE，长视频不会被源源不断的短片饿死
+- rank(entries, job_id) 按同样的顺序计算任务的排队位置（1 = 下一个执行），供前端显示排队进度；
+  entries 来自共享的任务存储（job_store.queued_jobs），任何一个 worker 进程都能回答
+- promote(job_id, lane)：interactive 请求附加到仍在 batch 队列里的任务时，把它移到 interactive 队列；
+  任务排在其他 worker 进程里时由该进程的空闲线程每 LANE_SYNC_INTERVAL 秒按 lane_source
+  （任务存储里记录的 lane）同步
+- 线程数与队列长度限制按进程计：gunicorn 开 N 个 worker 时总并发与总排队上限都是 N 倍
+"""
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+# 成本折算基准：720p
+REFERENCE_PIXELS = 1280 * 720
+# 有 batch 任务排队时，空闲线程按该间隔（秒）从 lane_source 同步其他进程做的提级
+LANE_SYNC_INTERVAL = 2.0
+
+
+def estimate_cost(info: Dict[str, Any]) -> float:
+    """估算分析成本：时长 × 像素数，折算成 720p 秒数；读不到元数据时按 0（当作短片）"""
+    duration = max(0.0, float(info.get("duration") or 0))
+    pixels = (info.get("width") or 0) * (info.get("height") or 0)
+    return duration * (pixels / REFERENCE_PIXELS if pixels else 1.0)
+
+
+class QueueFull(RuntimeError):
+    """等待队列已满"""
+
+    def __init__(self, lane: str, queue_size: int) -> None:
+        super().__init__(f"分析队列已满（{lane} 队列 {queue_size} 个任务排队中），请稍后重试")
+        self.lane = lane
+        self.queue_size = queue_size
+
+
+class _Task:
+    __slots__ = ("job_id", "fn", "args", "lane", "cost", "enqueued_at")
+
+    def __init__(self, job_id: str, fn: Callable[..., Any], args: tuple, lane: str, cost: float,
+                 enqueued_at: Optional[float] = None) -> None:
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.lane = lane
+        self.cost = cost
+        self.enqueued_at = enqueued_at or time.time()
+
+
+class AnalysisScheduler:
+    """按 lane 与成本排序的有界分析线程池；工作线程在第一次提交时启动"""
+
+    def __init__(self, workers: int, queue_sizes: Dict[str, int],
+                 interactive_reserved: int = 1, aging_rate: float = 1.0) -> None:
+        self.workers = max(1, workers)
+        self.queue_sizes = {lane: max(0, queue_sizes.get(lane, 0)) for lane in LANES}
+        # batch 可用线程数；只有一个线程时不预留，否则 batch 永远跑不了
+        self.batch_workers = max(1, self.workers - max(0, interactive_reserved))
+        self.aging_rate = aging_rate
+        self._queues: Dict[str, List[_Task]] = {lane: [] for lane in LANES}
+        self._running: Dict[str, str] = {}  # job_id -> lane
+        self._cond = threading.Condition()
+        self._threads: list = []
+        # 返回 {job_id: lane}（共享任务存储中记录的 lane），用于发现其他进程做的提级；None 则不同步
+        self.lane_source: Optional[Callable[[List[str]], Dict[str, str]]] = None
+
+    def submit(self, job_id: str, fn: Callable[..., Any], *args: Any,
+               lane: str = INTERACTIVE, cost: float = 0.0, enqueued_at: Optional[float] = None) -> int:
+        """排入 lane 队列，返回排队位置（0 = 有空闲线程、马上执行）；该 lane 队列满时抛 QueueFull
+
+        enqueued_at：最初入队时间（恢复的任务沿用原值，老化不从头算），与任务存储里的 queued_at 一致。
+        """
+        if lane not in LANES:
+            lane = INTERACTIVE
+        with self._cond:
+            self._ensure_workers()
+            immediate = self._can_start(lane)
+            if not immediate and len(self._queues[lane]) >= self.queue_sizes[lane]:
+                raise QueueFull(lane, self.queue_sizes[lane])
+            task = _Task(job_id, fn, args, lane, cost, enqueued_at)
+            self._queues[lane].append(task)
+            self._cond.notify_all()
+            return 0 if immediate else self._position(task)
+
+    def promote(self, job_id: str, lane: str = INTERACTIVE) -> bool:
+        """把仍在排队的任务移到 lane 队列（保留入队时间与成本），返回是否移动了；
+        已开始执行、不在本进程队列或已在该 lane 时返回 False"""
+        if lane not in LANES:
+            return False
+        with self._cond:
+            for queue in self._queues.values():
+                for task in queue:
+                    if task.job_id == job_id:
+                        if task.lane == lane:
+                            return False
+                        queue.remove(task)
+                        task.lane = lane
+                        self._queues[lane].append(task)
+                        self._cond.notify_all()
+                        logger.info("任务 %s 提级到 %s 队列", job_id, lane)
+                        return True
+        return False
+
+    def rank(self, entries: List[Dict[str, Any]], job_id: str) -> Optional[int]:
+        """job_id 在 entries（所有 worker 进程中排队的任务：job_id / lane / cost / queued_at）里
+        按执行顺序的位置（1 起）；不在其中返回 None"""
+        now = time.time()
+
+        def key(entry: Dict[str, Any]) -> tuple:
+            lane = entry.get("lane") if entry.get("lane") in LANES else INTERACTIVE
+            queued_at = entry.get("queued_at") or now
+            score = (entry.get("cost") or 0.0) - (now - queued_at) * self.aging_rate
+            return LANES.index(lane), score, queued_at
+
+        target = next((e for e in entries if e["job_id"] == job_id), None)
+        if target is None:
+            return None
+        target_key = key(target)
+        return sum(1 for e in entries if e is not target and key(e) < target_key) + 1
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            running = list(self._running.values())
+            return {
+                "workers": self.workers,
+                "batch_workers": self.batch_workers,
+                "lanes": {
+                    lane: {"running": running.count(lane), "queued": len(self._queues[lane]),
+                           "queue_size": self.queue_sizes[lane]}
+                    for lane in LANES
+                },
+            }
+
+    # ----------------------------------------------------------
+    # 调度（调用方持有 self._cond）
+    # ----------------------------------------------------------
+    def _score(self, task: _Task, now: float) -> float:
+        return task.cost - (now - task.enqueued_at) * self.aging_rate
+
+    def _ordered(self, lane: str, now: float) -> List[_Task]:
+        return sorted(self._queues[lane], key=lambda t: (self._score(t, now), t.enqueued_at))
+
+    def _position(self, task: _Task) -> int:
+        now = time.time()
+        ahead = 0
+        for lane in LANES:
+            ordered = self._ordered(lane, now)
+            if lane == task.lane:
+                return ahead + ordered.index(task) + 1
+            ahead += len(ordered)
+        return ahead
+
+    def _batch_running(self) -> int:
+        return sum(1 for lane in self._running.values() if lane == BATCH)
+
+    def _can_start(self, lane: str) -> bool:
+        """现在提交到 lane 的任务能否马上有线程执行（已在排队的任务先占线程）"""
+        free = self.workers - len(self._running) - len(self._queues[INTERACTIVE])
+        if lane == INTERACTIVE:
+            return free > 0
+        queued = len(self._queues[BATCH])
+        return free > queued and self._batch_running() + queued < self.batch_workers
+
+    def _next_task(self) -> Optional[_Task]:
+        now = time.time()
+        if self._queues[INTERACTIVE]:
+            task = self._ordered(INTERACTIVE, now)[0]
+        elif self._queues[BATCH] and self._batch_running() < self.batch_workers:
+            task = self._ordered(BATCH, now)[0]
+        else:
+            return None
+        self._queues[task.lane].remove(task)
+        return task
+
+    def _ensure_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._worker_loop, name=f"analysis-{len(self._threads)}", daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def _sync_lanes(self) -> None:
+        """按 lane_source 把其他进程已提级的 batch 任务移到对应队列（查询时不持有 self._cond）"""
+        with self._cond:
+            job_ids = [task.job_id for task in self._queues[BATCH]]
+        if not job_ids or self.lane_source is None:
+            return
+        try:
+            lanes = self.lane_source(job_ids)
+        except Exception as e:
+            logger.warning("同步任务 lane 失败: %s", e)
+            return
+        for job_id, lane in lanes.items():
+            if lane != BATCH:
+                self.promote(job_id, lane)
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                task = self._next_task()
+                if task is None:
+                    # 有 batch 任务在排队时定时醒来同步提级，否则一直等到有新任务或线程释放
+                    sync = self.lane_source is not None and bool(self._queues[BATCH])
+                    self._cond.wait(LANE_SYNC_INTERVAL if sync else None)
+                    task = self._next_task()
+                if task is not None:
+                    self._running[task.job_id] = task.lane
+            if task is None:
+                self._sync_lanes()
+                continue
+            try:
+                task.fn(*task.args)
+            except Exception as e:
+                # 任务函数自己负责把错误写进 job_store，这里只防止线程退出
+                logger.exception("分析任务 %s 异常退出: %s", task.job_id, e)
+            finally:
+                with self._cond:
+                    self._running.pop(task.job_id, None)
+                    # 释放的可能是 batch 名额，唤醒所有等待线程重新判断
+                    self._cond.notify_all()
+
+
+analysis_scheduler = AnalysisScheduler(
+    workers=Config.ANALYSIS_WORKERS,
+    queue_sizes={INTERACTIVE: Config.ANALYSIS_QUEUE_SIZE, BATCH: Config.ANALYSIS_BATCH_QUEUE_SIZE},
+    interactive_reserved=Config.ANALYSIS_INTERACTIVE_RESERVED,
+    aging_rate=Config.ANALYSIS_AGING_RATE,
+)
@@ -0,0 +1,222 @@
+"""
+分片上传模块 - 大视频的断点续传协议（init / put-chunk / finalize）
+
+流程：
+1. init：登记文件名与总大小，预分配 data/uploads/_parts/{upload_id}.part
+2. put-chunk：客户端带 offset 并行上传分片，每片直接写到 part 文件对应位置；
+   已收到的区间记录在同目录的 {upload_id}.json 里，断线/重启后可查询续传；
+   多个 worker 进程共享会话：每次读改写都在 {upload_id}.json.lock 的跨进程锁内重新读盘，
+   不在进程内缓存会话
+3. finalize：确认区间覆盖整个文件后，part 文件交给 save_upload_file 直接入库（硬链接，不再复制），再走 analyze_async 流程
+"""
+import os
+import re
+import json
+import time
+import uuid
+import logging
+from typing import Dict, List, Optional, Any, BinaryIO
+
+from utils.file_lock import file_lock, unique_tmp_path
+from utils.local_video_processor import UPLOAD_DIR, MAX_FILE_SIZE, ALLOWED_EXT, UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+PART_DIR = os.path.join(UPLOAD_DIR, "_parts")
+# 单个分片上限（远小于 Flask MAX_CONTENT_LENGTH）
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+# 建议客户端使用的分片大小
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# 未完成的上传会话保留 24 小时
+SESSION_TTL = 24 * 3600
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+os.makedirs(PART_DIR, exist_ok=True)
+
+
+class UploadSessionStore:
+    """分片上传会话（元数据落盘，进程重启后仍可续传，多进程共享）"""
+
+    def __init__(self, part_dir: str = PART_DIR) -> None:
+        self.part_dir = part_dir
+
+    # ----------------------------------------------------------
+    # 路径 / 持久化
+    # ----------------------------------------------------------
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.part_dir, f"{upload_id}.json")
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.part_dir, f"{upload_id}.part")
+
+    def _locked(self, upload_id: str):
+        """会话元数据的跨进程锁"""
+        return file_lock(self._meta_path(upload_id))
+
+    def _persist(self, sess: Dict[str, Any]) -> None:
+        path = self._meta_path(sess["upload_id"])
+        tmp = unique_tmp_path(path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sess, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _load(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """从磁盘读会话（调用方持有 _locked 锁，读到的总是其他进程写入后的最新区间）"""
+        path = self._meta_path(upload_id)
+        if not os.path.exists(path) or not os.path.exists(self.part_path(upload_id)):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sess = json.load(f)
+        except Exception as e:
+            logger.warning("读取上传会话 %s 失败: %s", upload_id, e)
+            return None
+        return sess
+
+    @staticmethod
+    def _valid_id(upload_id: str) -> bool:
+        return bool(_UPLOAD_ID_RE.match(upload_id or ""))
+
+    @staticmethod
+    def _merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+        """把 [start, end) 并入已排序的不相交区间列表"""
+        merged: List[List[int]] = []
+        for s, e in sorted(ranges + [[start, end]]):
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        return merged
+
+    @staticmethod
+    def _received(sess: Dict[str, Any]) -> int:
+        return sum(e - s for s, e in sess["ranges"])
+
+    @classmethod
+    def _public(cls, sess: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "upload_id": sess["upload_id"],
+            "filename": sess["filename"],
+            "size": sess["size"],
+            "received": cls._received(sess),
+            "ranges": [list(r) for r in sess["ranges"]],
+            "complete": sess["ranges"] == [[0, sess["size"]]],
+        }
+
+    # ----------------------------------------------------------
+    # 协议
+    # ----------------------------------------------------------
+    def create(self, filename: str, size: int, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """init：登记新会话并预分配 part 文件"""
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ALLOWED_EXT:
+            raise ValueError(f"不支持的视频格式: {ext}")
+        if size <= 0:
+            raise ValueError("文件内容为空")
+        if size > MAX_FILE_SIZE:
+            raise ValueError(f"文件过大，超过 {MAX_FILE_SIZE // 1024 // 1024}MB 限制")
+
+        upload_id = uuid.uuid4().hex
+        with open(self.part_path(upload_id), "wb") as f:
+            f.truncate(size)
+        sess = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "ranges": [],
+            "meta": meta or {},
+            "created_at": time.time(),
+        }
+        with self._locked(upload_id):
+            self._persist(sess)
+        return self._public(sess)
+
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO) -> Dict[str, Any]:
+        """put-chunk：把请求体写到 part 文件的 offset 处；同一分片可重复上传"""
+        if not self._valid_id(upload_id):
+            raise KeyError(upload_id)
+        with self._locked(upload_id):
+            sess = self._load(upload_id)
+            if not sess:
+                raise KeyError(upload_id)
+            size = sess["size"]
+        if offset < 0 or offset >= size:
+            raise ValueError(f"offset 越界: {offset}")
+
+        # 每个分片独立文件句柄，多个分片可并行写入不同区间
+        written = 0
+        with open(self.part_path(upload_id), "r+b") as f:
+            f.seek(offset)
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > MAX_CHUNK_SIZE or offset + written > size:
+                    raise ValueError("分片超出允许大小或文件总长度")
+                f.write(chunk)
+        if written == 0:
+            raise ValueError("分片内容为空")
+
+        # 写完分片后重新读盘再合并：其他进程可能在此期间记录了别的分片
+        with self._locked(upload_id):
+            sess = self._load(upload_id)
+            if not sess:
+                raise KeyError(upload_id)
+            sess["ranges"] = self._merge_range(sess["ranges"], offset, offset + written)
+            self._persist(sess)
+            return self._public(sess)
+
+    def status(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """查询已收到的区间，供断线后续传"""
+        if not self._valid_id(upload_id):
+            return None
+        with self._locked(upload_id):
+            sess = self._load(upload_id)
+            return self._public(sess) if sess else None
+
+    def finalize(self, upload_id: str) -> Dict[str, Any]:
+        """finalize：校验完整性，返回会话信息（含 part 路径与 init 时的 meta）"""
+        if not self._valid_id(upload_id):
+            raise KeyError(upload_id)
+        with self._locked(upload_id):
+            sess = self._load(upload_id)
+            if not sess:
+                raise KeyError(upload_id)
+            if sess["ranges"] != [[0, sess["size"]]]:
+                raise ValueError(f"分片未传完：已收到 {self._received(sess)}/{sess['size']} 字节")
+            info = self._public(sess)
+        info["meta"] = dict(sess.get("meta") or {})
+        info["part_path"] = self.part_path(upload_id)
+        return info
+
+    def discard(self, upload_id: str) -> None:
+        if not self._valid_id(upload_id):
+            return
+        with self._locked(upload_id):
+            for path in (self._meta_path(upload_id), self.part_path(upload_id)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        try:
+            os.remove(f"{self._meta_path(upload_id)}.lock")
+        except OSError:
+            pass
+
+    def cleanup(self, max_age: int = SESSION_TTL) -> None:
+        """清理过期的未完成会话"""
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.part_dir):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                if os.path.getmtime(os.path.join(self.part_dir, name)) < cutoff:
+                    self.discard(upload_id)
+            except OSError:
+                pass
+
+
+upload_sessions = UploadSessionStore()
@@ -4,6 +4,8 @@ import requests
 from datetime import datetime
 from typing import Dict, List, Optional
 from config import Config
+from utils.http_client import http_client
+from utils.provider_health import provider_health, ProviderUnavailable
 
 class FencingAI:
     def __init__(self):
@@ -113,8 +115,10 @@ class FencingAI:
         # 分析用户意图
         intent = self._analyze_intent(user_message)
         
-        # 优先尝试使用配置的LLM提供商（如果可用）
-        if self.current_provider and self._is_provider_available(self.current_provider):
+        # 优先尝试使用配置的LLM提供商（如果可用）；熔断打开时不等超时，直接走本地知识库
+        if self.current_provider and provider_health.is_open(self.current_provider):
+            print(f"[{self.current_provider.capitalize()}] 熔断中，直接使用本地知识库")
+        elif self.current_provider and self._is_provider_available(self.current_provider):
             print(f"[{self.current_provider.capitalize()}] 尝试调用{self.current_provider.capitalize()} API...")
             try:
                 response = self._call_llm_api(user_message, video_context, short_response=short_response)
@@ -480,11 +484,17 @@ class FencingAI:
             print(f"[{provider.capitalize()}] 发送请求到: {config['base_url']}{config['endpoint']}")
             print(f"[{provider.capitalize()}] 模型: {config['model']}, 消息数: {len(messages)}, short={short_response}")
 
-            response = requests.post(
-                f"{config['base_url']}{config['endpoint']}",
-                headers=headers,
-                json=payload,
-                timeout=30
+            # 连接失败 / 5xx 退避重试；读超时不重试，避免交互延迟翻倍
+            response = provider_health.call(
+                provider,
+                lambda: http_client.post(
+                    f"{config['base_url']}{config['endpoint']}",
+                    "chat",
+                    headers=headers,
+                    json=payload
+                ),
+                attempts=self.config.LLM_MAX_ATTEMPTS,
+                retry_read_timeout=False
             )
 
             print(f"[{provider.capitalize()}] 收到响应，状态码: {response.status_code}")
@@ -499,8 +509,11 @@ class FencingAI:
                 print(f"{provider.capitalize()} API调用失败: {response.status_code} - {response.text[:200]}")
                 return None
 
+        except ProviderUnavailable:
+            print(f"[{provider.capitalize()}] 熔断中，使用本地知识库")
+            return None
         except requests.exceptions.Timeout:
-            print(f"[{provider.capitalize()}] API请求超时（30秒），使用本地知识库")
+            print(f"[{provider.capitalize()}] API请求超时（{http_client.timeout('chat')[1]:.0f}秒），使用本地知识库")
             return None
         except requests.exceptions.RequestException as e:
             print(f"[{provider.capitalize()}] API请求异常: {e}")
@@ -562,14 +575,16 @@ class FencingAI:
             "minimax_available": bool(self.config.MINIMAX_API_KEY),
             "current_provider": self.current_provider,
             "fallback_enabled": self.fallback_to_local,
+            "provider_health": provider_health.snapshot(),
             "conversation_count": len(self.conversation_history),
             "last_activity": self.conversation_history[-1]["timestamp"] if self.conversation_history else None
         }
     
     def get_advanced_analysis(self, question: str, video_context: str = "") -> str:
         """获取高级分析"""
-        # 优先使用配置的LLM提供商（如果可用）
-        if self.current_provider and self._is_provider_available(self.current_provider):
+        # 优先使用配置的LLM提供商（如果可用且未熔断）
+        if (self.current_provider and self._is_provider_available(self.current_provider)
+                and not provider_health.is_open(self.current_provider)):
             try:
                 response = self._call_llm_api(question, video_context)
                 if response:
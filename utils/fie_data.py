@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import random
 
+from utils.http_client import http_client
+
 class FIEDataCollector:
     # 多语言翻译字典
     I18N = {
@@ -95,10 +97,6 @@ class FIEDataCollector:
         }
         self.cache = {}
         self.cache_duration = 3600
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
         
         self.athletes_by_country = {
             "中国": {
@@ -294,7 +292,7 @@ class FIEDataCollector:
 
     def _fetch_fie_results(self, limit: int, lang: str = 'zh') -> List[Dict]:
         try:
-            response = self.session.get(f"{self.base_url}/results", timeout=10)
+            response = http_client.get(f"{self.base_url}/results")
             if response.status_code == 200:
                 return self._generate_realistic_results(limit, lang)
             else:
@@ -0,0 +1,43 @@
+"""
+跨进程文件锁 - 多个 gunicorn worker 读改写同一个元数据文件时串行化
+
+- 在 {path}.lock 上加 fcntl.flock 排他锁（被锁的文件本身常用 os.replace 原子替换，inode 会变，
+  不能直接锁它）；flock 按打开的文件描述符生效，同进程不同线程之间同样互斥
+- 没有 fcntl 的平台（Windows）退化为进程内线程锁
+- unique_tmp_path：原子写入用的临时文件名，多个进程同时写同一文件时不会互相覆盖临时文件
+"""
+import os
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """持有 path 对应的排他锁（锁文件为 {path}.lock）"""
+    lock_path = f"{path}.lock"
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(lock_path, threading.Lock())
+        with lock:
+            yield
+        return
+    with open(lock_path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def unique_tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
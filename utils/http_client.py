@@ -0,0 +1,84 @@
+"""
+共享 HTTP 客户端 - 所有出站请求（DeepSeek / MiniMax / FIE / YouTube）复用连接
+
+- 每个主机一个 requests.Session + HTTPAdapter 连接池，keep-alive 复用 TCP+TLS 连接，
+  聊天 / 弹幕请求不再每次握手
+- 池大小、连接超时与各类请求的读超时都来自 Config（HTTP_*）
+- 调用方按请求类型（chat / vision / translate / scrape / probe）取超时，不再各自硬编码
+"""
+import logging
+import threading
+from typing import Dict, Any, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class HttpClient:
+    """按主机划分连接池的线程安全 HTTP 客户端"""
+
+    def __init__(self, pool_maxsize: int, connect_timeout: float,
+                 read_timeouts: Dict[str, float], default_read_timeout: float = 30) -> None:
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeouts = dict(read_timeouts)
+        self.default_read_timeout = default_read_timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        """取（必要时创建）该 URL 所在主机的 Session"""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            sess = self._sessions.get(key)
+            if sess is None:
+                sess = requests.Session()
+                # 失败重试由调用方决定（provider 级别的退避 / 熔断），连接池本身不重试
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                      max_retries=0)
+                sess.mount(f"{parts.scheme}://", adapter)
+                sess.headers.update({"User-Agent": USER_AGENT})
+                self._sessions[key] = sess
+                logger.info("创建 HTTP 连接池 %s（maxsize=%d）", key, self.pool_maxsize)
+            return sess
+
+    def timeout(self, endpoint: str) -> Tuple[float, float]:
+        """(连接超时, 读超时)"""
+        return self.connect_timeout, self.read_timeouts.get(endpoint, self.default_read_timeout)
+
+    def request(self, method: str, url: str, endpoint: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout(endpoint))
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def get(self, url: str, endpoint: str = "scrape", **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url: str, endpoint: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for sess in sessions:
+            sess.close()
+
+
+http_client = HttpClient(
+    pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+    connect_timeout=Config.HTTP_CONNECT_TIMEOUT,
+    read_timeouts={
+        "chat": Config.HTTP_CHAT_TIMEOUT,
+        "vision": Config.HTTP_VISION_TIMEOUT,
+        "translate": Config.HTTP_TRANSLATE_TIMEOUT,
+        "scrape": Config.HTTP_SCRAPE_TIMEOUT,
+        "probe": Config.HTTP_PROBE_TIMEOUT,
+    },
+)
@@ -0,0 +1,425 @@
+"""
+分析任务状态存储
+
+- JobStore：进程内 dict，重启即丢失，只适合单进程调试
+- SQLiteJobStore：data/jobs.db（WAL 模式），多个 gunicorn worker 共享同一份任务状态，
+  任何一个 worker 都能回答 /api/analyze_status；按 job_id（主键）和 video_id 建索引
+- wait_for_update：阻塞到任务 version 变化，供 SSE 进度推送；本进程内的 update 立即唤醒，
+  SQLite 下其他进程的更新按 POLL_INTERVAL 读一次 version 列发现
+- 已结束的任务超过 JOB_TTL 秒自动清理（create 时顺带执行，最多每分钟一次）
+- 崩溃恢复：任务记录 owner（主机名:pid:启动令牌）与启动参数，进程重启后把属于已退出进程的
+  pending / running 任务原子地认领过来并重新排队（见 LocalVideoProcessor.recover_jobs）
+- owner 存活判定：持有任务的进程每 JOB_OWNER_LEASE / 4 秒在 owners 表续约一次心跳，
+  超过 JOB_OWNER_LEASE 秒没有心跳即视为已退出；本机上 pid 已不存在、或 pid 与本进程相同但令牌不同
+  （容器重启后 pid 常与上次相同）立即视为已退出
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 未结束的任务状态
+ACTIVE_STATUSES = ("pending", "running")
+# 两次 TTL 清理的最小间隔（秒）
+CLEANUP_INTERVAL = 60
+
+
+# 当前进程的 (pid, 启动令牌)；pid 变化（fork）后重新生成
+_identity: Tuple[int, str] = (0, "")
+
+
+def current_owner() -> str:
+    """当前进程的身份 主机名:pid:启动令牌，写在任务的 owner 字段里
+
+    令牌每个进程随机生成一次（gunicorn preload 后 fork，按 pid 变化重新生成，不能在导入时固定）。
+    """
+    global _identity
+    pid = os.getpid()
+    if _identity[0] != pid:
+        _identity = (pid, uuid.uuid4().hex[:12])
+    return f"{socket.gethostname()}:{pid}:{_identity[1]}"
+
+
+def _pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # 进程存在，只是属于其他用户
+    return True
+
+
+def _owner_alive(owner: str, heartbeat: Optional[float], lease: float,
+                 stale_after: float, updated_at: float) -> bool:
+    """owner 进程是否仍在运行
+
+    本机上 pid 已不存在、或是本进程的 pid 却不是本进程的令牌（上一次运行遗留）直接判定为已退出；
+    其余情况看心跳是否在租约内。没有令牌的旧格式 owner（主机名:pid）没有心跳，只能看任务多久没有更新。
+    """
+    if owner == current_owner():
+        return True
+    parts = owner.split(":")
+    token = parts.pop() if len(parts) >= 3 else ""
+    host, pid = ":".join(parts[:-1]), parts[-1]
+    if host == socket.gethostname() and pid.isdigit():
+        if int(pid) == os.getpid() or not _pid_running(int(pid)):
+            return False
+    if token:
+        return heartbeat is not None and time.time() - heartbeat < lease
+    return time.time() - updated_at < stale_after
+
+
+class JobStore:
+    """轻量级内存任务状态（重启即丢失，符合"本地"语义）"""
+
+    # wait_for_update 检查其他进程更新的间隔（秒）；内存存储只有本进程会更新，无需轮询
+    POLL_INTERVAL: Optional[float] = None
+
+    def __init__(self, ttl: int = 3600) -> None:
+        self.ttl = ttl
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._generation = 0  # 每次 _notify 加 1，wait_for_update 据此发现读版本号期间错过的通知
+        self._last_cleanup = 0.0
+
+    def create(self, video_id: str, params: Optional[Dict[str, Any]] = None) -> str:
+        self._maybe_cleanup()
+        job = self._new_job(video_id, params)
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+        return job["job_id"]
+
+    def create_or_attach(self, video_id: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, bool]:
+        """single-flight：该视频已有未结束的任务时返回 (该任务 id, False)，否则新建并返回 (新 id, True)"""
+        self._maybe_cleanup()
+        with self._lock:
+            active = [j for j in self._jobs.values() if j["video_id"] == video_id and j["status"] in ACTIVE_STATUSES]
+            if active:
+                return max(active, key=lambda j: j["created_at"])["job_id"], False
+            job = self._new_job(video_id, params)
+            self._jobs[job["job_id"]] = job
+        return job["job_id"], True
+
+    @staticmethod
+    def _new_job(video_id: str, params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "job_id": uuid.uuid4().hex[:16],
+            "video_id": video_id,
+            "status": "pending",  # pending / running / done / error
+            "progress": 0,
+            "step": "等待开始",
+            "result": None,
+            "partial": None,  # 分析进行中已得到的 key_moments / actions
+            "error": None,
+            "params": params or {},
+            "owner": current_owner(),
+            "version": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def update(self, job_id: str, where_status: Optional[str] = None, **kwargs) -> None:
+        """更新任务字段；where_status 给定时只在任务仍处于该状态时更新（避免覆盖已开始执行的任务）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or (where_status and job["status"] != where_status):
+                return
+            job.update(kwargs)
+            job["version"] += 1
+            job["updated_at"] = time.time()
+        self._notify()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def version(self, job_id: str) -> Optional[int]:
+        """任务当前版本号（每次 update 加 1）；任务不存在返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job["version"] if job else None
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def wait_for_update(self, job_id: str, since_version: int, timeout: float) -> Optional[int]:
+        """阻塞到任务版本超过 since_version 或超时，返回当前版本号（任务不存在返回 None）
+
+        只比较版本号，不复制整条任务（含完整 result）；调用方看到版本变化后再 get。
+        读版本号（SQLite 查询）时不持有 _changed，不会挡住其他线程 update 后的 _notify；
+        读之前记下通知代数，读完发现代数已变就不再等待，直接重读。
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self._changed:
+                generation = self._generation
+            version = self.version(job_id)
+            remaining = deadline - time.time()
+            if version is None or version > since_version or remaining <= 0:
+                return version
+            with self._changed:
+                if self._generation == generation:
+                    self._changed.wait(remaining if self.POLL_INTERVAL is None else min(remaining, self.POLL_INTERVAL))
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def queued_jobs(self) -> List[Dict[str, Any]]:
+        """排队中（pending）任务的调度信息：job_id / lane / cost / queued_at，供计算排队位置"""
+        with self._lock:
+            return [self._queue_entry(j["job_id"], j["params"], j["created_at"])
+                    for j in self._jobs.values() if j["status"] == "pending"]
+
+    @staticmethod
+    def _queue_entry(job_id: str, params: Optional[Dict[str, Any]], created_at: float) -> Dict[str, Any]:
+        params = params or {}
+        return {"job_id": job_id, "lane": params.get("lane"), "cost": params.get("cost") or 0.0,
+                "queued_at": params.get("queued_at") or created_at}
+
+    def claim_orphans(self) -> List[Dict[str, Any]]:
+        """内存存储随进程一起消失，没有可恢复的任务"""
+        return []
+
+    def _maybe_cleanup(self) -> None:
+        if time.time() - self._last_cleanup >= CLEANUP_INTERVAL:
+            self._last_cleanup = time.time()
+            self.cleanup(self.ttl)
+
+    def cleanup(self, max_age: int = 3600) -> None:
+        """清理 max_age 秒前结束的任务"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            for jid in list(self._jobs.keys()):
+                job = self._jobs[jid]
+                if job["status"] not in ACTIVE_STATUSES and job["updated_at"] < cutoff:
+                    del self._jobs[jid]
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite（WAL）持久化任务状态，多进程共享；每个线程一个连接"""
+
+    POLL_INTERVAL = 1.0
+
+    # JSON 序列化存储的字段
+    JSON_FIELDS = ("result", "partial", "params")
+    COLUMNS = ("job_id", "video_id", "status", "progress", "step", "result", "partial", "error",
+               "params", "owner", "version", "created_at", "updated_at")
+
+    def __init__(self, path: str, ttl: int = 3600, stale_after: float = 900, lease: float = 60) -> None:
+        super().__init__(ttl)
+        self.path = path
+        self.stale_after = stale_after
+        self.lease = lease
+        self._local = threading.local()
+        self._heartbeat_pid = 0
+        self._heartbeat_guard = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id     TEXT PRIMARY KEY,
+                    video_id   TEXT NOT NULL,
+                    status     TEXT NOT NULL,
+                    progress   INTEGER NOT NULL DEFAULT 0,
+                    step       TEXT,
+                    result     TEXT,
+                    partial    TEXT,
+                    error      TEXT,
+                    params     TEXT,
+                    owner      TEXT,
+                    version    INTEGER NOT NULL DEFAULT 1,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_video ON jobs (video_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS owners (
+                    owner     TEXT PRIMARY KEY,
+                    heartbeat REAL NOT NULL
+                )""")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _row_to_job(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        for k in self.JSON_FIELDS:
+            job[k] = json.loads(job[k]) if job[k] else None
+        job["params"] = job["params"] or {}
+        return job
+
+    def create(self, video_id: str, params: Optional[Dict[str, Any]] = None) -> str:
+        self._maybe_cleanup()
+        with self._conn() as conn:
+            return self._insert(conn, video_id, params)
+
+    def create_or_attach(self, video_id: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, bool]:
+        """查找与新建在同一个写事务（BEGIN IMMEDIATE）里完成，多个 worker 进程同时提交也只会建一个任务；
+        owner 已退出的遗留任务不会被附加，在同一事务里标记为已被新任务取代（error），
+        recover_jobs 不会再认领它，同一视频不会被分析两遍"""
+        self._maybe_cleanup()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT j.job_id, j.owner, j.updated_at, o.heartbeat FROM jobs j"
+                " LEFT JOIN owners o ON o.owner = j.owner"
+                " WHERE j.video_id = ? AND j.status IN ('pending', 'running')"
+                " ORDER BY j.created_at DESC", (video_id,)).fetchall()
+            for row in rows:
+                if self._alive(row):
+                    return row["job_id"], False
+            job_id = self._insert(conn, video_id, params)
+            for row in rows:
+                conn.execute(
+                    "UPDATE jobs SET status = 'error', step = '失败', error = ?, version = version + 1, updated_at = ?"
+                    " WHERE job_id = ? AND owner IS ?",
+                    (f"分析中断，已由新任务 {job_id} 接替", time.time(), row["job_id"], row["owner"]))
+            return job_id, True
+
+    def _alive(self, row: sqlite3.Row) -> bool:
+        return _owner_alive(row["owner"] or "", row["heartbeat"], self.lease, self.stale_after, row["updated_at"])
+
+    def _insert(self, conn: sqlite3.Connection, video_id: str, params: Optional[Dict[str, Any]]) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs (job_id, video_id, status, progress, step, params, owner, version, created_at, updated_at)"
+            " VALUES (?, ?, 'pending', 0, '等待开始', ?, ?, 1, ?, ?)",
+            (job_id, video_id, json.dumps(params or {}, ensure_ascii=False), current_owner(), now, now),
+        )
+        self._beat(conn)
+        self._ensure_heartbeat()
+        return job_id
+
+    # ----------------------------------------------------------
+    # owner 心跳
+    # ----------------------------------------------------------
+    @staticmethod
+    def _beat(conn: sqlite3.Connection) -> None:
+        conn.execute("INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)", (current_owner(), time.time()))
+
+    def _ensure_heartbeat(self) -> None:
+        """本进程持有任务后启动心跳线程（fork 出的子进程没有父进程的线程，按 pid 判断重新启动）"""
+        pid = os.getpid()
+        if self._heartbeat_pid == pid:
+            return
+        with self._heartbeat_guard:
+            if self._heartbeat_pid == pid:
+                return
+            self._heartbeat_pid = pid
+            threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(1.0, self.lease / 4)
+        while True:
+            time.sleep(interval)
+            try:
+                with self._conn() as conn:
+                    self._beat(conn)
+            except sqlite3.Error as e:
+                logger.warning("任务 owner 心跳写入失败: %s", e)
+
+    def update(self, job_id: str, where_status: Optional[str] = None, **kwargs) -> None:
+        fields = {k: v for k, v in kwargs.items() if k in self.COLUMNS and k not in ("job_id", "version", "updated_at")}
+        if not fields:
+            return
+        values = [json.dumps(v, ensure_ascii=False) if k in self.JSON_FIELDS and v is not None else v
+                  for k, v in fields.items()]
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        condition, extra = ("AND status = ?", (where_status,)) if where_status else ("", ())
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"UPDATE jobs SET {assignments}, version = version + 1, updated_at = ? WHERE job_id = ? {condition}",
+                (*values, time.time(), job_id, *extra),
+            )
+        if cur.rowcount:
+            self._notify()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def version(self, job_id: str) -> Optional[int]:
+        row = self._conn().execute("SELECT version FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row["version"] if row else None
+
+    def delete(self, job_id: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def queued_jobs(self) -> List[Dict[str, Any]]:
+        """所有 worker 进程中排队的任务（status 索引上的范围查询，只取调度需要的列）"""
+        rows = self._conn().execute(
+            "SELECT job_id, params, created_at FROM jobs WHERE status = 'pending'").fetchall()
+        return [self._queue_entry(row["job_id"], json.loads(row["params"]) if row["params"] else None,
+                                  row["created_at"]) for row in rows]
+
+    def claim_orphans(self) -> List[Dict[str, Any]]:
+        """把 owner 已退出的 pending / running 任务改为本进程所有并重置为 pending，返回认领到的任务
+
+        用 owner 做比较交换：多个 worker 同时启动时每个任务只会被一个进程认领。
+        """
+        rows = self._conn().execute(
+            "SELECT j.job_id, j.owner, j.updated_at, o.heartbeat FROM jobs j"
+            " LEFT JOIN owners o ON o.owner = j.owner WHERE j.status IN ('pending', 'running')").fetchall()
+        claimed = []
+        for row in rows:
+            if self._alive(row):
+                continue
+            with self._conn() as conn:
+                self._beat(conn)
+                cur = conn.execute(
+                    "UPDATE jobs SET owner = ?, status = 'pending', progress = 0, step = '等待恢复',"
+                    " partial = NULL, version = version + 1, updated_at = ? WHERE job_id = ? AND owner IS ?",
+                    (current_owner(), time.time(), row["job_id"], row["owner"]),
+                )
+            if cur.rowcount:
+                self._ensure_heartbeat()
+                claimed.append(self.get(row["job_id"]))
+        return [job for job in claimed if job]
+
+    def cleanup(self, max_age: int = 3600) -> None:
+        """删除 max_age 秒前结束的任务"""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('pending', 'running') AND updated_at < ?",
+                (time.time() - max_age,),
+            )
+            conn.execute("DELETE FROM owners WHERE heartbeat < ?", (time.time() - max(max_age, self.lease),))
+        if cur.rowcount:
+            logger.info("清理过期任务 %d 个", cur.rowcount)
+
+
+def create_job_store(backend: str = Config.JOB_STORE_BACKEND) -> JobStore:
+    if backend == "memory":
+        return JobStore(ttl=Config.JOB_TTL)
+    return SQLiteJobStore(Config.JOB_DB_PATH, ttl=Config.JOB_TTL, stale_after=Config.JOB_STALE_TIMEOUT,
+                          lease=Config.JOB_OWNER_LEASE)
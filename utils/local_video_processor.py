@@ -6,22 +6,32 @@
    - ≤45MB：base64 内联到请求体（video_url data URL）
    - >45MB：先调 MiniMax Files API 上传，拿到 file_id，再用 mm_file://file_id 引用
 2. MiniMax M3 直接理解视频并返回结构化 JSON：关键时刻、动作识别、文字/字幕
-3. 落地到 data/analysis/{video_id}.json
-4. 通过内存 job_store 暴露进度供前端轮询
+3. 落地到 data/analysis/{video_id}.json（video_id 为完整内容哈希，上传文件按内容去重存放）；
+   该文件是中文规范结果，en/ja 翻译层在首次请求时生成并存为 {video_id}.{lang}.json
+4. 通过 job_store（默认 SQLite，多 worker 共享）暴露进度供前端轮询
 """
+import io
 import os
-import re
+import copy
 import json
 import time
-import base64
-import hashlib
 import logging
-import requests
 import threading
 import uuid
-from typing import Dict, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Any, BinaryIO, Tuple
 from datetime import datetime
 from config import Config
+from utils.analysis_scheduler import BATCH, INTERACTIVE, QueueFull, analysis_scheduler, estimate_cost
+from utils.http_client import http_client
+from utils.job_store import create_job_store
+from utils.model_output import StreamItemParser, extract_json, strip_think
+from utils.provider_health import provider_health
+from utils.translation_memory import translation_memory
+from utils.video_payload import B64JsonBody, PreparedBody
+from utils.video_store import VideoStore, hash_bytes
+from utils.video_transcoder import ProxyCache, plan_compression, transcode_pool
+from utils.vision_windows import plan_windows, merge_windows
 
 logger = logging.getLogger(__name__)
 
@@ -32,61 +42,42 @@ MAX_FILE_SIZE = 512 * 1024 * 1024
 B64_THRESHOLD = 30 * 1024 * 1024
 # M3 实际视频限制 50MB（超出需要本地压缩到 ≤45MB 再走 base64）
 COMPRESS_TARGET = 40 * 1024 * 1024  # 压缩目标 40MB，预留余量
+# 超过该大小的视频按关键帧分段、多进程并行转码
+SEGMENT_THRESHOLD = 2 * B64_THRESHOLD
+# 流式落盘的块大小：上传流按块写盘，内存占用与文件大小无关
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 ALLOWED_EXT = {".mp4", ".mov", ".webm", ".avi", ".mkv", ".m4v"}
 
 # 落地目录
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "uploads")
 FRAME_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "frames")
 ANALYSIS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "analysis")
+PROXY_DIR = os.path.join(UPLOAD_DIR, "_compressed")
 
-for d in (UPLOAD_DIR, FRAME_DIR, ANALYSIS_DIR):
-    os.makedirs(d, exist_ok=True)
-
+# 分析结果的规范语言（M3 实际总是输出中文）；其他语言是叠加在其上的翻译层
+CANONICAL_LANG = "zh"
+TRANSLATABLE_LANGS = ("en", "ja")
+# 翻译层覆盖的字段
+TRANSLATED_FIELDS = ("key_moments", "actions", "text_in_video", "summary", "weapon_guess")
+# 译文可以写回翻译记忆的术语类字段（标题、描述、概述等自由文本复用率低，不入库）
+LEARNABLE_FIELDS = ("type", "action", "weapon_guess")
 
-class JobStore:
-    """轻量级内存任务状态（重启即丢失，符合"本地"语义）"""
+for d in (UPLOAD_DIR, FRAME_DIR, ANALYSIS_DIR, PROXY_DIR):
+    os.makedirs(d, exist_ok=True)
 
-    def __init__(self) -> None:
-        self._jobs: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
-
-    def create(self, video_id: str) -> str:
-        job_id = uuid.uuid4().hex[:16]
-        with self._lock:
-            self._jobs[job_id] = {
-                "job_id": job_id,
-                "video_id": video_id,
-                "status": "pending",  # pending / running / done / error
-                "progress": 0,
-                "step": "等待开始",
-                "result": None,
-                "error": None,
-                "created_at": time.time(),
-            }
-        return job_id
 
-    def update(self, job_id: str, **kwargs) -> None:
-        with self._lock:
-            job = self._jobs.get(job_id)
-            if not job:
-                return
-            job.update(kwargs)
+job_store = create_job_store()
+video_store = VideoStore(UPLOAD_DIR, ALLOWED_EXT, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE)
+proxy_cache = ProxyCache(PROXY_DIR, Config.PROXY_CACHE_MAX_MB * 1024 * 1024)
 
-    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            job = self._jobs.get(job_id)
-            return dict(job) if job else None
 
-    def cleanup(self, max_age: int = 3600) -> None:
-        """清理 1 小时前的旧任务"""
-        cutoff = time.time() - max_age
-        with self._lock:
-            for jid in list(self._jobs.keys()):
-                if self._jobs[jid].get("created_at", 0) < cutoff:
-                    del self._jobs[jid]
+def _stored_lanes(job_ids: List[str]) -> Dict[str, str]:
+    """任务存储里记录的 lane（其他 worker 进程提级后写入），供调度器同步"""
+    wanted = set(job_ids)
+    return {e["job_id"]: e["lane"] for e in job_store.queued_jobs() if e["job_id"] in wanted and e["lane"]}
 
 
-job_store = JobStore()
+analysis_scheduler.lane_source = _stored_lanes
 
 
 class LocalVideoProcessor:
@@ -94,17 +85,17 @@ class LocalVideoProcessor:
 
     def __init__(self) -> None:
         self.config = Config()
+        # 同一视频同一语言的翻译层只生成一次
+        self._layer_locks: Dict[str, threading.Lock] = {}
+        self._layer_locks_guard = threading.Lock()
 
     # ----------------------------------------------------------
     # 工具
     # ----------------------------------------------------------
     @staticmethod
-    def compute_video_id(filename: str, content: bytes) -> str:
-        """根据文件名+内容前 1MB 算一个稳定 id（同名不同内容也能区分）"""
-        h = hashlib.sha1()
-        h.update(filename.encode("utf-8"))
-        h.update(content[: 1024 * 1024])
-        return h.hexdigest()[:16]
+    def compute_video_id(content: bytes) -> str:
+        """按完整内容算稳定 id（与文件名无关，换名上传也能命中缓存）"""
+        return hash_bytes(content)
 
     @staticmethod
     def get_video_info(video_path: str) -> Dict[str, Any]:
@@ -249,15 +240,20 @@ class LocalVideoProcessor:
             "JSON のみを出力し、他の説明は付けないでください。"
         )
 
-    def _call_minimax_b64(self, video_path: str, weapon_hint: str, lang: str = "zh") -> str:
-        """B 路径：≤45MB 视频直接 base64 内联到 video_url.data URL"""
+    def _call_minimax_b64(self, video_path: str, weapon_hint: str, lang: str = "zh",
+                          duration_sec: Optional[float] = None,
+                          on_item: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> str:
+        """B 路径：≤45MB 视频直接 base64 内联到 video_url.data URL
+
+        duration_sec：调用方已通过 get_video_info 读到的时长，避免为拼 prompt 再打开一次容器。
+        on_item：流式模式（VISION_STREAM）下每解析出一个完整的 key_moments / actions 元素回调一次。
+        """
         api_key = self.config.MINIMAX_API_KEY
         if not api_key:
             raise RuntimeError("MINIMAX_API_KEY 未配置")
+        if duration_sec is None:
+            duration_sec = self._get_duration(video_path)
 
-        with open(video_path, "rb") as f:
-            video_bytes = f.read()
-        b64 = base64.b64encode(video_bytes).decode("ascii")
         ext = os.path.splitext(video_path)[1].lower().lstrip(".") or "mp4"
         mime = "video/mp4" if ext == "mp4" else f"video/{ext}"
 
@@ -277,12 +273,12 @@ class LocalVideoProcessor:
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": self._build_vision_prompt(weapon_hint, self._get_duration(video_path), lang)},
+                        {"type": "text", "text": self._build_vision_prompt(weapon_hint, duration_sec, lang)},
                         {
                             "type": "video_url",
                             "video_url": {
-                                "url": f"data:{mime};base64,{b64}",
-                                "fps": 1,            # 1 fps 均匀采样
+                                "url": f"data:{mime};base64,{B64JsonBody.PLACEHOLDER}",
+                                "fps": self.config.VIDEO_SAMPLE_FPS,  # 均匀采样（默认 1 fps）
                                 "detail": "high",    # 高细节：抽更多帧
                             },
                         },
@@ -291,135 +287,200 @@ class LocalVideoProcessor:
             ],
             "temperature": 0.3,
             "max_tokens": 8000,
+            "stream": self.config.VISION_STREAM,
         }
-        last_err = None
-        for attempt in range(1, 4):  # M3 间歇性 500，最多重试 3 次
-            try:
-                print(f"[M3] 尝试 {attempt}/3 → POST {url[:50]}... payload {len(b64)/1024/1024:.1f}MB b64", flush=True)
-                r = requests.post(url, json=payload, headers=headers, timeout=300)
-                print(f"[M3] 响应 status={r.status_code} time={r.elapsed.total_seconds():.1f}s", flush=True)
-                if r.status_code >= 400:
-                    raise RuntimeError(f"MiniMax b64 失败 {r.status_code}: {r.text[:200]}")
-                data = r.json()
-                content = (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
-                print(f"[M3] 成功 content 长度 {len(content)}", flush=True)
-                return content
-            except Exception as e:
-                last_err = e
-                print(f"[M3] 失败 (尝试 {attempt}/3): {e}", flush=True)
-                if attempt < 3:
-                    import time
-                    time.sleep(3)
-        raise last_err
-
-    def _compress_to_b64(self, video_path: str, weapon_hint: str, lang: str = "zh") -> str:
+        # 请求体流式生成：视频按块读出并 base64 编码，不在内存里拼整段字符串；
+        # 只编码一次写入临时文件，重试时原样重发
+        with PreparedBody(B64JsonBody(payload, video_path)) as body:
+            # M3 间歇性 500：最多 3 次，全抖动指数退避；连续不可达时熔断
+            print(f"[M3] POST {url[:50]}... payload {len(body)/1024/1024:.1f}MB", flush=True)
+            r = provider_health.call(
+                "minimax",
+                lambda: http_client.post(url, "vision", data=body, headers=headers, stream=payload["stream"]),
+                attempts=3)
+        print(f"[M3] 响应 status={r.status_code} time={r.elapsed.total_seconds():.1f}s", flush=True)
+        if r.status_code >= 400:
+            raise RuntimeError(f"MiniMax b64 失败 {r.status_code}: {r.text[:200]}")
+        if "text/event-stream" in r.headers.get("Content-Type", ""):
+            return self._read_vision_stream(r, on_item)
+        data = r.json()
+        content = (data.get("choices") or [{}])[0].get("message", {}).get("content", "")
+        print(f"[M3] 成功 content 长度 {len(content)}", flush=True)
+        return content
+
+    @staticmethod
+    def _read_vision_stream(r, on_item: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> str:
+        """读 SSE 流：逐段喂给 StreamItemParser，<think> 段随收随丢，数组元素一完整就回调
+
+        返回去掉 <think> 后的正文，交给 _parse_vision_text 做最终解析。
+        """
+        parser = StreamItemParser()
+        first_item_at = None
+        finish_reason = None
+        with r:
+            for line in r.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].strip()
+                if data == b"[DONE]":
+                    break
+                event = json.loads(data)
+                base_resp = event.get("base_resp") or {}
+                if base_resp.get("status_code"):
+                    raise RuntimeError(f"MiniMax b64 失败 {base_resp['status_code']}: {base_resp.get('status_msg', '')}")
+                choice = (event.get("choices") or [{}])[0]
+                finish_reason = choice.get("finish_reason") or finish_reason
+                for key, item in parser.feed((choice.get("delta") or {}).get("content") or ""):
+                    if first_item_at is None:
+                        first_item_at = time.time()
+                        print(f"[M3] 流式首个 {key} 元素到达", flush=True)
+                    if on_item:
+                        on_item(key, item)
+        if finish_reason == "length":
+            logger.warning("M3 输出达到 max_tokens 被截断，按截断 JSON 修复")
+        content = parser.result_text()
+        print(f"[M3] 流式完成 content 长度 {len(content)}（原始 {parser.total_chars}）", flush=True)
+        return content
+
+    def _compress_to_b64(self, video_path: str, weapon_hint: str, lang: str = "zh",
+                         info: Optional[Dict[str, Any]] = None,
+                         on_item: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> str:
         """C 路径（替代方案）：>45MB 视频先本地 PyAV 压缩到 ≤45MB，再走 B 路径
 
         注意：MiniMax Files API 不支持视频 purpose，所以大视频必须在本地压缩。
-        压缩策略：720p / 1.5Mbps / h264，按比例缩时长（如仍然超就降码率/降分辨率）
+        压缩策略：720p / h264，码率 = 预算 / 时长（上限 1.5Mbps，过低时降分辨率）；
+        默认按 M3 抽帧率输出低帧率代理（VIDEO_COMPRESS_MODE=lowfps）
+        """
+        video_id = os.path.splitext(os.path.basename(video_path))[0]
+        info = info or self.get_video_info(video_path)
+        # 编码前按时长和 COMPRESS_TARGET 算好码率，一次编码落在预算内
+        # lowfps 模式：按模型抽帧率（VIDEO_SAMPLE_FPS）重编码，编码量和体积按帧数同比下降
+        proxy_fps = self.config.VIDEO_SAMPLE_FPS if self.config.VIDEO_COMPRESS_MODE == "lowfps" else None
+        profile = plan_compression(info, COMPRESS_TARGET, fps=proxy_fps)
+
+        def build(out_path: str) -> None:
+            if os.path.getsize(video_path) > SEGMENT_THRESHOLD:
+                compressed_size = transcode_pool.transcode_segmented(video_path, out_path, profile, info["duration"])
+            else:
+                compressed_size = transcode_pool.transcode(video_path, out_path, profile)
+            logger.info("压缩完成: %.1fMB → %.1fMB (%dx%d@%s, %dkbps)",
+                        os.path.getsize(video_path) / 1024 / 1024,
+                        compressed_size / 1024 / 1024, profile["width"], profile["height"],
+                        profile["fps"] or info["fps"], profile["bit_rate"] // 1000)
+
+            # 兜底：时长未知等情况规划失准时，按实际超出比例再压一次
+            if compressed_size > COMPRESS_TARGET:
+                logger.warning("压缩结果超出预算，按比例降码率重压")
+                retry = dict(profile, options=dict(profile["options"]))
+                retry["bit_rate"] = int(profile["bit_rate"] * COMPRESS_TARGET / compressed_size * 0.9)
+                retry["options"].update(maxrate=str(retry["bit_rate"]), bufsize=str(retry["bit_rate"] * 2))
+                transcode_pool.transcode(video_path, out_path, retry)
+                logger.info("重压后: %.1fMB", os.path.getsize(out_path) / 1024 / 1024)
+
+        # 压缩代理按 video_id + 压缩参数缓存：换语言重分析 / 出错重试直接复用；
+        # 请求发完之前钉住，不被其他分析触发的淘汰删掉
+        with proxy_cache.use(video_id, profile, build) as proxy_path:
+            return self._call_minimax_b64(proxy_path, weapon_hint, lang, info["duration"], on_item)
+
+    def _use_windows(self, info: Dict[str, Any]) -> bool:
+        """时长超过 VISION_WINDOW_THRESHOLD 的视频走分窗分析（阈值为 0 时关闭）"""
+        threshold = self.config.VISION_WINDOW_THRESHOLD
+        return threshold > 0 and info.get("duration", 0) > threshold
+
+    def _analysis_path(self, size: int, info: Dict[str, Any]) -> str:
+        if self._use_windows(info):
+            return "windowed"
+        return "b64" if size <= B64_THRESHOLD else "compress_b64"
+
+    def _analyze_window(self, video_path: str, weapon_hint: str, lang: str, info: Dict[str, Any],
+                        start: float, end: float) -> Dict[str, Any]:
+        """截取 [start, end) 转成低帧率片段（按 video_id + 时间窗缓存）后单独调用 M3"""
+        video_id = os.path.splitext(os.path.basename(video_path))[0]
+        proxy_fps = self.config.VIDEO_SAMPLE_FPS if self.config.VIDEO_COMPRESS_MODE == "lowfps" else None
+        profile = plan_compression(dict(info, duration=end - start), COMPRESS_TARGET, fps=proxy_fps)
+        profile["clip"] = [start, end]
+
+        def build(out_path: str) -> None:
+            transcode_pool.transcode_clip(video_path, out_path, profile, start, end)
+
+        with proxy_cache.use(video_id, profile, build) as clip_path:
+            text = self._call_minimax_b64(clip_path, weapon_hint, lang, end - start)
+        parsed = self._parse_vision_text(text)
+        if not parsed:
+            raise RuntimeError(f"窗口 {start:.0f}-{end:.0f}s 输出无法解析")
+        return parsed
+
+    def _analyze_windowed(self, video_path: str, weapon_hint: str, lang: str, info: Dict[str, Any],
+                          on_partial: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """长视频切成重叠时间窗，按 VISION_PARALLELISM 并发分析后合并
+
+        单个窗失败只丢该窗；全部失败时抛出第一个窗的异常（沿用审核拒绝 / 500 的处理）。
+        on_partial：每完成一个窗回调一次，参数为已完成各窗的合并结果（含 done / total）。
+        """
+        overlap = self.config.VISION_WINDOW_OVERLAP
+        grid = 1.0 / self.config.VIDEO_SAMPLE_FPS if self.config.VIDEO_COMPRESS_MODE == "lowfps" else None
+        windows = plan_windows(info["duration"], self.config.VISION_WINDOW_SEC, overlap, grid=grid)
+        logger.info("分窗分析: %d 窗（%.0fs 窗长 / %.0fs 重叠 / 并发 %d）", len(windows),
+                    self.config.VISION_WINDOW_SEC, overlap, self.config.VISION_PARALLELISM)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(windows)
+        errors: List[Exception] = []
+        workers = max(1, min(self.config.VISION_PARALLELISM, len(windows)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-window") as pool:
+            futures = {
+                pool.submit(self._analyze_window, video_path, weapon_hint, lang, info, start, end): i
+                for i, (start, end) in enumerate(windows)
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    start, end = windows[i]
+                    logger.warning("窗口 %.0f-%.0fs 分析失败: %s", start, end, e)
+                    errors.append(e)
+                if on_partial and results[i]:
+                    merged = merge_windows(windows, results, overlap)
+                    on_partial({
+                        "key_moments": merged["key_moments"],
+                        "actions": merged["actions"],
+                        "done": len(errors) + sum(1 for r in results if r),
+                        "total": len(windows),
+                    })
+        if not any(results):
+            raise errors[0]
+        return merge_windows(windows, results, overlap)
+
+    def _call_vision_llm(self, video_path: str, weapon_hint: str, lang: str = "zh",
+                         info: Optional[Dict[str, Any]] = None,
+                         on_partial: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """按时长 / 文件大小选择分窗、B（base64） 或 C（本地压缩 + base64）路径，返回结构化结果
+
+        on_partial：分析过程中有新的关键时刻可展示时回调（分窗：每完成一窗；流式：每个完整元素）。
         """
-        import av
-        from fractions import Fraction
-        tmp_dir = os.path.join(os.path.dirname(video_path), "_compressed")
-        os.makedirs(tmp_dir, exist_ok=True)
-        out_path = os.path.join(tmp_dir, os.path.basename(video_path))
-
-        # 读原视频
-        src = av.open(video_path)
-        src_stream = src.streams.video[0]
-        orig_w, orig_h = src_stream.width, src_stream.height
-        # 帧率：average_rate 可能是 Fraction/0（变量）或 None
-        try:
-            orig_fps = float(src_stream.average_rate) if src_stream.average_rate else 30.0
-        except Exception:
-            orig_fps = 30.0
-        if orig_fps <= 0 or orig_fps > 120:
-            orig_fps = 30.0
-        # PyAV 需要 Fraction
-        fps_frac = Fraction(orig_fps).limit_denominator(1000)
-
-        # 目标：720p，长边 1280
-        if orig_w >= orig_h:
-            tgt_w, tgt_h = 1280, int(orig_h * 1280 / orig_w)
-            if tgt_h % 2: tgt_h += 1
-        else:
-            tgt_h, tgt_w = 1280, int(orig_w * 1280 / orig_h)
-            if tgt_w % 2: tgt_w += 1
-
-        # 写新视频
-        dst = av.open(out_path, mode='w')
-        dst_stream = dst.add_stream('libx264', rate=fps_frac)
-        dst_stream.width, dst_stream.height = tgt_w, tgt_h
-        dst_stream.pix_fmt = 'yuv420p'
-        # 先用 1.5Mbps；不够再降
-        dst_stream.bit_rate = 1_500_000
-        dst_stream.options = {'preset': 'medium', 'crf': '26'}
-
-        for frame in src.decode(video=0):
-            img = frame.to_image()
-            if img.width != tgt_w or img.height != tgt_h:
-                img = img.resize((tgt_w, tgt_h))
-            new_frame = av.VideoFrame.from_image(img).reformat(format='yuv420p')
-            new_frame.pts = frame.pts
-            new_frame.time_base = frame.time_base
-            for p in dst_stream.encode(new_frame):
-                dst.mux(p)
-        for p in dst_stream.encode():
-            dst.mux(p)
-        dst.close()
-        src.close()
-
-        compressed_size = os.path.getsize(out_path)
-        logger.info("压缩完成: %.1fMB → %.1fMB (%dx%d@%s)",
-                    os.path.getsize(video_path) / 1024 / 1024,
-                    compressed_size / 1024 / 1024, tgt_w, tgt_h, orig_fps)
-
-        # 如果仍 > 45MB，再压一次（降码率）
-        if compressed_size > B64_THRESHOLD:
-            logger.info("一次压缩后仍超阈值，二次压缩（降码率）")
-            os.remove(out_path)
-            dst2 = av.open(out_path, mode='w')
-            ds2 = dst2.add_stream('libx264', rate=fps_frac)
-            ds2.width, ds2.height = tgt_w, tgt_h
-            ds2.pix_fmt = 'yuv420p'
-            ds2.bit_rate = 800_000
-            ds2.options = {'preset': 'medium', 'crf': '30'}
-            src2 = av.open(video_path)
-            for frame in src2.decode(video=0):
-                img = frame.to_image()
-                if img.width != tgt_w or img.height != tgt_h:
-                    img = img.resize((tgt_w, tgt_h))
-                nf = av.VideoFrame.from_image(img).reformat(format='yuv420p')
-                nf.pts = frame.pts
-                nf.time_base = frame.time_base
-                for p in ds2.encode(nf):
-                    dst2.mux(p)
-            for p in ds2.encode():
-                dst2.mux(p)
-            dst2.close()
-            src2.close()
-            logger.info("二次压缩后: %.1fMB", os.path.getsize(out_path) / 1024 / 1024)
-
-        try:
-            return self._call_minimax_b64(out_path, weapon_hint, lang)
-        finally:
-            try:
-                os.remove(out_path)
-            except Exception:
-                pass
-
-    def _call_vision_llm(self, video_path: str, weapon_hint: str, lang: str = "zh") -> Dict[str, Any]:
-        """按文件大小自动选择 B（base64） 或 C（本地压缩 + base64）路径，返回结构化结果"""
         size = os.path.getsize(video_path)
+        info = info or self.get_video_info(video_path)
         result_text = ""
-        path_used = "b64" if size <= B64_THRESHOLD else "compress_b64"
+        path_used = self._analysis_path(size, info)
         try:
+            # 熔断打开时不再转码 / 编码请求体，直接回退启发式
+            provider_health.check("minimax")
+            if path_used == "windowed":
+                logger.info("视频 %.0fs 超过 %.0fs，走分窗分析", info["duration"], self.config.VISION_WINDOW_THRESHOLD)
+                return self._analyze_windowed(video_path, weapon_hint, lang, info, on_partial)
+            # 流式输出时每个完整的关键时刻 / 动作立即发布到 partial
+            streamed: Dict[str, List[Dict[str, Any]]] = {"key_moments": [], "actions": []}
+
+            def on_item(key: str, item: Dict[str, Any]) -> None:
+                streamed[key].append(item)
+                if on_partial:
+                    on_partial({k: list(v) for k, v in streamed.items()})
+
             if path_used == "b64":
                 logger.info("视频 %.1fMB ≤ 45MB，走 B 路径 (base64 内联)", size / 1024 / 1024)
-                result_text = self._call_minimax_b64(video_path, weapon_hint, lang)
+                result_text = self._call_minimax_b64(video_path, weapon_hint, lang, info["duration"], on_item)
             else:
                 logger.info("视频 %.1fMB > 45MB，走 C 路径 (本地 PyAV 压缩到 ≤45MB 后 base64)", size / 1024 / 1024)
-                result_text = self._compress_to_b64(video_path, weapon_hint, lang)
+                result_text = self._compress_to_b64(video_path, weapon_hint, lang, info, on_item)
         except Exception as e:
             err = str(e)
             print(f"[ERR] M3 异常 caught: err={err[:300]!r}", flush=True)
@@ -447,228 +508,96 @@ class LocalVideoProcessor:
                 }
             logger.warning("MiniMax M3 调用失败 (%s 路径): %s，回退到启发式", path_used, e)
 
-        # 解析 JSON（M3 会先 <think>...</think> 输出思考过程，再输出 JSON）
-        if result_text:
-            candidate = None
-
-            # 1) 优先：从 </think> 之后取（如果有 think 块的话）
-            split_idx = result_text.rfind('</think>')
-            if split_idx >= 0:
-                after_think = result_text[split_idx + len('</think>'):].strip()
-                # 如果 think 块后是空（没结束标签的极端情况），则用整段
-                if not after_think:
-                    after_think = result_text
-            else:
-                # 没 think 块，用整段
-                after_think = result_text
-            print(f"[JSON] think块后长度: {len(after_think)}", flush=True)
-            print(f"[JSON] think块后前 200: {after_think[:200]!r}", flush=True)
-
-            # 2) 去 markdown 代码块包裹
-            m_code = re.search(r'```(?:json)?\s*(\{[\s\S]*?\})\s*```', after_think)
-            if m_code:
-                candidate = m_code.group(1)
-                print(f"[JSON] 从代码块匹配到", flush=True)
-            else:
-                # 3) 用栈匹配找最外层 JSON（处理嵌套 { }）
-                start = after_think.find('{')
-                print(f"[JSON] 代码块无匹配，找 {{ 位置: {start}", flush=True)
-                if start >= 0:
-                    depth = 0
-                    in_string = False
-                    escape = False
-                    end = -1
-                    for i in range(start, len(after_think)):
-                        ch = after_think[i]
-                        if escape:
-                            escape = False
-                            continue
-                        if ch == '\\':
-                            escape = True
-                            continue
-                        if ch == '"' and not escape:
-                            in_string = not in_string
-                            continue
-                        if in_string:
-                            continue
-                        if ch == '{':
-                            depth += 1
-                        elif ch == '}':
-                            depth -= 1
-                            if depth == 0:
-                                end = i + 1
-                                break
-                    print(f"[JSON] 栈匹配 end: {end}", flush=True)
-                    if end > start:
-                        candidate = after_think[start:end]
-                        print(f"[JSON] candidate 长度: {len(candidate)}, 前 100: {candidate[:100]!r}", flush=True)
-                else:
-                    # 栈匹配失败（M3 输出被 max_tokens 截断，JSON 不完整）
-                    # 用 raw_decode 尝试从 start 处开始解析，
-                    # 如果能解析出第一个完整 JSON 对象（哪怕后面被截断），也用之
-                    print(f"[JSON] 栈匹配失败，尝试 raw_decode 补救...", flush=True)
-                    try:
-                        import json as _json
-                        decoder = _json.JSONDecoder()
-                        obj, consumed = decoder.raw_decode(after_think, start)
-                        import json as _json2
-                        candidate = _json2.dumps(obj, ensure_ascii=False)
-                        print(f"[JSON] ✅ raw_decode 成功，consumed={consumed}，截断后 JSON 长度 {len(candidate)}", flush=True)
-                    except Exception as _e:
-                        print(f"[JSON] ❌ raw_decode 也失败: {_e}", flush=True)
-
-            if candidate:
-                try:
-                    parsed = json.loads(candidate)
-                    print(f"[JSON] ✅ 解析成功 keys: {list(parsed.keys())}", flush=True)
-                    # M3 视频分析硬性输出中文（prompt 无法覆盖），
-                    # 非中文界面下用 minimax 文本模型做字段级翻译
-                    if lang in ("en", "ja") and parsed:
-                        parsed = self._translate_analysis(parsed, lang)
-                    return parsed
-                except Exception as e:
-                    print(f"[JSON] ❌ 解析失败: {e}\n候选: {candidate[:500]}", flush=True)
-                    logger.warning("JSON 解析失败: %s", e)
-            else:
-                print(f"[JSON] ❌ candidate 为空，跳过", flush=True)
+        parsed = self._parse_vision_text(result_text) if result_text else None
+        if parsed:
+            return parsed
 
         # 启发式回退（API 失败 / key 缺失）
         return self._fallback_analysis(weapon_hint, size)
 
+    @staticmethod
+    def _parse_vision_text(result_text: str) -> Optional[Dict[str, Any]]:
+        """从 M3 输出中取出分析 JSON（去 <think>、代码块，截断时补齐括号）；解析不出时返回 None"""
+        parsed = extract_json(result_text)
+        if parsed is None:
+            logger.warning("M3 输出中没有可解析的 JSON（%d 字符）: %r", len(result_text), result_text[-200:])
+        else:
+            print(f"[JSON] ✅ 解析成功 keys: {list(parsed.keys())}", flush=True)
+        return parsed
+
     def _translate_analysis(self, parsed: Dict[str, Any], target_lang: str) -> Dict[str, Any]:
-        """M3 视频分析硬性输出中文，用 minimax 文本模型翻译 key_moments / actions / summary / text_in_video 字段
+        """M3 视频分析硬性输出中文，把 key_moments / actions / text_in_video / summary / weapon_guess
+        逐行翻译成 target_lang（'en' / 'ja'）
 
-        target_lang: 'en' or 'ja'
+        以行为单位查翻译记忆，只有记忆里没有的行才合并成一次 minimax 文本模型请求；
+        只有类型 / 动作 / 剑种这类术语字段的译文会写回记忆。
         """
-        target_label = "English" if target_lang == "en" else "日本語 (Japanese)"
+        fields = [(m, k) for m in parsed.get("key_moments") or [] for k in ("type", "title", "description", "tactic")]
+        fields += [(a, k) for a in parsed.get("actions") or [] for k in ("action", "note")]
+        fields += [(parsed, "summary"), (parsed, "weapon_guess")]
+        fields = [(obj, k) for obj, k in fields if isinstance(obj, dict) and isinstance(obj.get(k), str) and obj[k]]
+        texts = [t for t in parsed.get("text_in_video") or [] if isinstance(t, str)]
+
+        lines = [line for obj, k in fields for line in obj[k].split("\n")] + texts
+        learnable = {obj[k] for obj, k in fields if k in LEARNABLE_FIELDS}
         try:
-            # 收集需要翻译的文本
-            items = []  # [(ref, value)]
-            for m in parsed.get("key_moments", []):
-                for k in ("type", "title", "description", "tactic"):
-                    if m.get(k):
-                        items.append(("km." + str(len(items)), m.get(k)))
-            for a in parsed.get("actions", []):
-                if a.get("action"):
-                    items.append(("ac." + str(len(items)), a.get("action")))
-                if a.get("note"):
-                    items.append(("ac." + str(len(items)), a.get("note")))
-            for i, t in enumerate(parsed.get("text_in_video", []) or []):
-                items.append(("tv." + str(i), t))
-            summary = parsed.get("summary", "")
-            weapon_guess = parsed.get("weapon_guess", "")
-            if summary:
-                items.append(("summary", summary))
-
-            if not items:
-                return parsed
-
-            # 构造翻译请求
-            lines = [f"{ref}\t{text}" for ref, text in items]
-            source = "\n".join(lines)
-            prompt = (
-                f"Translate the following Chinese fencing-analysis lines to {target_label}. "
-                f"Keep the TAB-separated format. Do NOT translate fencing technical terms (lunge, parry, riposte, fleche, attack, defense, etc.) — translate as common English/Japanese words instead. "
-                f"Output ONLY the translated lines in the same order, one per line, TAB-separated.\n\n"
-                f"{source}"
-            )
-            api_key = self.config.MINIMAX_API_KEY
-            if not api_key:
-                return parsed
-            url = f"{self.config.MINIMAX_BASE_URL.rstrip('/')}/chat/completions"
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-            payload = {
-                "model": self.config.MINIMAX_MODEL,
-                "messages": [
-                    {"role": "system", "content": f"You are a professional Chinese-to-{target_label} translator for fencing sports."},
-                    {"role": "user", "content": prompt},
-                ],
-                "temperature": 0.1,
-                "max_tokens": 4000,
-            }
-            print(f"[翻译] {len(items)} 条 → {target_lang}", flush=True)
-            r = requests.post(url, json=payload, headers=headers, timeout=120)
-            if r.status_code >= 400:
-                print(f"[翻译] HTTP {r.status_code}: {r.text[:200]}", flush=True)
-                return parsed
-            content = (r.json().get("choices") or [{}])[0].get("message", {}).get("content", "")
-            print(f"[翻译] 成功 {len(content)} chars", flush=True)
-            translated_lines = [l for l in content.split("\n") if "\t" in l]
-
-            # 回写：先收集 i-> text 索引
-            def _split_take(items_list, prefix):
-                m = {}
-                for ref, text in items_list:
-                    if ref.startswith(prefix):
-                        m[ref] = text
-                return m
-
-            km_map = {}
-            ac_map = {}
-            tv_map = {}
-            summary_orig = ""
-            for line in translated_lines:
-                ref, txt = line.split("\t", 1)
-                txt = txt.strip()
-                if ref == "summary":
-                    summary_orig = txt
-                elif ref.startswith("km."):
-                    km_map[ref] = txt
-                elif ref.startswith("ac."):
-                    ac_map.setdefault(ref, []).append(txt)
-                elif ref.startswith("tv."):
-                    tv_map[ref] = txt
-
-            # 写回 key_moments（按出现顺序配对）
-            km_items = [it for it in items if it[0].startswith("km.")]
-            new_moments = []
-            for (ref, _orig), m in zip(km_items, parsed.get("key_moments", [])):
-                # km.0 一个 ref 对应 4 个字段 (type/title/description/tactic)
-                # ref 是 km.0, km.1, ... 每个 ref 对应 1 个字段
-                pass  # 改用更简单方法：直接按 ref 出现顺序平铺
-            # 实际更简单：把 km_items 平铺成 4 个一组
-            flat = []
-            for ref, orig in km_items:
-                flat.append((ref, orig))
-            # 配对：每个 km 块是 4 个连续 ref
-            idx = 0
-            for m in parsed.get("key_moments", []):
-                for k in ("type", "title", "description", "tactic"):
-                    if m.get(k):
-                        if idx < len(flat):
-                            ref, _ = flat[idx]
-                            m[k] = km_map.get(ref, m[k])
-                        idx += 1
-            # actions
-            ac_items = [it for it in items if it[0].startswith("ac.")]
-            # 一个 ac 有 action 和可选 note，配对方式：按出现顺序，note 紧跟 action
-            for a, (ref, _) in zip(parsed.get("actions", []), ac_items):
-                vals = ac_map.get(ref, [])
-                if a.get("action") and vals:
-                    a["action"] = vals[0]
-                if a.get("note") and len(vals) > 1:
-                    a["note"] = vals[1]
-            # text_in_video
-            tv_items = [it for it in items if it[0].startswith("tv.")]
-            new_tv = []
-            for i, (ref, _) in enumerate(tv_items):
-                new_tv.append(tv_map.get(ref, parsed.get("text_in_video", [])[i] if i < len(parsed.get("text_in_video", [])) else ""))
-            if new_tv:
-                parsed["text_in_video"] = new_tv
-            # summary
-            if summary_orig:
-                parsed["summary"] = summary_orig
-            # weapon_guess
-            wg_map = {"花剑": "foil", "重剑": "épée", "佩剑": "sabre", "未知": "unknown",
-                      "フォイル": "foil", "エペ": "épée", "サーブル": "sabre", "不明": "unknown"}
-            wg = parsed.get("weapon_guess", "")
-            if wg in wg_map:
-                parsed["weapon_guess"] = wg_map[wg]
-            return parsed
+            mapping = translation_memory.translate(
+                lines, target_lang, lambda missing: self._translate_lines(missing, target_lang), learnable)
         except Exception as e:
             print(f"[翻译] 失败（保留中文）: {e}", flush=True)
             return parsed
 
+        def tr(text: str) -> str:
+            return "\n".join(mapping.get(line, line) for line in text.split("\n"))
+
+        for obj, k in fields:
+            obj[k] = tr(obj[k])
+        if texts:
+            parsed["text_in_video"] = [tr(t) for t in texts]
+        return parsed
+
+    def _translate_lines(self, lines: List[str], target_lang: str) -> Dict[str, str]:
+        """一次请求翻译多行，返回 {原文: 译文}
+
+        请求失败时抛异常，由 _translate_analysis 整体保留中文（不写入翻译层缓存）。
+        """
+        api_key = self.config.MINIMAX_API_KEY
+        if not api_key:
+            raise RuntimeError("未配置 MINIMAX_API_KEY")
+        provider_health.check("minimax")
+        target_label = "English" if target_lang == "en" else "日本語 (Japanese)"
+        source = "\n".join(f"{i}\t{line}" for i, line in enumerate(lines))
+        prompt = (
+            f"Translate the following Chinese fencing-analysis lines to {target_label}. "
+            f"Keep the TAB-separated format. Do NOT translate fencing technical terms (lunge, parry, riposte, fleche, attack, defense, etc.) — translate as common English/Japanese words instead. "
+            f"Output ONLY the translated lines in the same order, one per line, TAB-separated.\n\n"
+            f"{source}"
+        )
+        url = f"{self.config.MINIMAX_BASE_URL.rstrip('/')}/chat/completions"
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        payload = {
+            "model": self.config.MINIMAX_MODEL,
+            "messages": [
+                {"role": "system", "content": f"You are a professional Chinese-to-{target_label} translator for fencing sports."},
+                {"role": "user", "content": prompt},
+            ],
+            "temperature": 0.1,
+            "max_tokens": 4000,
+        }
+        print(f"[翻译] {len(lines)} 行 → {target_lang}", flush=True)
+        r = provider_health.call(
+            "minimax", lambda: http_client.post(url, "translate", json=payload, headers=headers), attempts=2)
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:200]}")
+        content = (r.json().get("choices") or [{}])[0].get("message", {}).get("content", "")
+        out: Dict[str, str] = {}
+        for row in strip_think(content).splitlines():
+            ref, sep, text = row.partition("\t")
+            if sep and ref.strip().isdigit() and int(ref) < len(lines) and text.strip():
+                out[lines[int(ref)]] = text.strip()
+        print(f"[翻译] 成功 {len(out)}/{len(lines)} 行", flush=True)
+        return out
+
     @staticmethod
     def _fallback_analysis(weapon_hint: str, file_size: int = 0) -> Dict[str, Any]:
         """API 失败时的兜底分析"""
@@ -694,16 +623,71 @@ class LocalVideoProcessor:
     # ----------------------------------------------------------
     # 公开入口
     # ----------------------------------------------------------
-    def analyze_async(self, video_id: str, video_path: str, weapon_hint: str, lang: str = "zh") -> str:
-        """异步分析：返回 job_id，后台线程跑完后写入 job_store"""
-        job_id = job_store.create(video_id)
-        thread = threading.Thread(
-            target=self._analyze_worker,
-            args=(job_id, video_id, video_path, weapon_hint, lang),
-            daemon=True,
-        )
-        thread.start()
-        return job_id
+    def analyze_async(self, video_id: str, video_path: str, weapon_hint: str, lang: str = "zh",
+                      lane: str = INTERACTIVE) -> Tuple[str, bool]:
+        """异步分析：按 lane（interactive / batch）与估算成本交给 analysis_scheduler 排队执行，
+        返回 (job_id, 是否附加到已有任务)
+
+        同一 video_id 已有 pending / running 任务时不再重复转码和调用 M3，直接返回该任务
+        （分析总是按规范语言进行，不同界面语言在读取结果时各自叠加翻译层）；interactive 请求附加到
+        仍在 batch 队列排队的任务时把它提级到 interactive。
+        等待队列已满时抛 QueueFull（不留下任务记录）。
+        """
+        cost = estimate_cost(self.get_video_info(video_path))
+        params = {"video_path": video_path, "weapon_hint": weapon_hint, "lang": lang, "lane": lane, "cost": cost,
+                  "queued_at": time.time()}
+        job_id, created = job_store.create_or_attach(video_id, params)
+        if not created:
+            print(f"[分析] {video_id} 已在分析中，附加到任务 {job_id}", flush=True)
+            if lane == INTERACTIVE:
+                self._promote_job(job_id)
+            return job_id, True
+        try:
+            position = analysis_scheduler.submit(
+                job_id, self._analyze_worker, job_id, video_id, video_path, weapon_hint, lang,
+                lane=lane, cost=cost, enqueued_at=params["queued_at"])
+        except Exception:
+            job_store.delete(job_id)
+            raise
+        if position:
+            # 工作线程可能已经取走任务并写入了自己的进度，只在仍为 pending 时改写步骤
+            job_store.update(job_id, where_status="pending", step="排队等待分析")
+        return job_id, False
+
+    @staticmethod
+    def _promote_job(job_id: str) -> None:
+        """有人在页面上等这个任务了：仍在 batch 队列排队的任务提级到 interactive
+
+        任务存储里的 lane 一并改掉（排队位置按它计算，任务排在其他 worker 进程时由该进程同步过去）。
+        """
+        job = job_store.get(job_id)
+        params = (job or {}).get("params") or {}
+        if not job or job["status"] != "pending" or params.get("lane") != BATCH:
+            return
+        job_store.update(job_id, params=dict(params, lane=INTERACTIVE))
+        analysis_scheduler.promote(job_id, INTERACTIVE)
+
+    def recover_jobs(self) -> int:
+        """进程启动时把已退出进程遗留的 pending / running 任务重新排队，返回恢复的任务数"""
+        recovered = 0
+        for job in job_store.claim_orphans():
+            params = job.get("params") or {}
+            if not params.get("video_path") or not os.path.exists(params["video_path"]):
+                job_store.update(job["job_id"], status="error", error="视频文件已不存在", step="失败")
+                continue
+            try:
+                analysis_scheduler.submit(
+                    job["job_id"], self._analyze_worker, job["job_id"], job["video_id"],
+                    params["video_path"], params.get("weapon_hint", ""), params.get("lang", CANONICAL_LANG),
+                    lane=params.get("lane", INTERACTIVE), cost=params.get("cost", 0.0),
+                    enqueued_at=params.get("queued_at"))
+            except QueueFull as e:
+                job_store.update(job["job_id"], status="error", error=str(e), step="失败")
+                continue
+            recovered += 1
+        if recovered:
+            print(f"[任务恢复] 重新排队 {recovered} 个中断的分析任务", flush=True)
+        return recovered
 
     def _analyze_worker(self, job_id: str, video_id: str, video_path: str, weapon_hint: str, lang: str = "zh") -> None:
         try:
@@ -715,12 +699,25 @@ class LocalVideoProcessor:
             file_size = os.path.getsize(video_path)
 
             size_mb = file_size / 1024 / 1024
-            if file_size <= B64_THRESHOLD:
+            analyze_path = self._analysis_path(file_size, info)
+            if analyze_path == "windowed":
+                step_msg = f"调用 MiniMax M3 (分窗分析 · {duration:.0f}s 视频按 {self.config.VISION_WINDOW_SEC:.0f}s 分窗并发)"
+            elif file_size <= B64_THRESHOLD:
                 step_msg = f"调用 MiniMax M3 (B 路径 · base64 · {size_mb:.1f}MB)"
             else:
                 step_msg = f"调用 MiniMax M3 (C 路径 · 本地压缩到≤45MB 后 base64 · 原始 {size_mb:.1f}MB)"
             job_store.update(job_id, progress=40, step=step_msg)
-            ai_result = self._call_vision_llm(video_path, weapon_hint, lang)
+
+            def on_partial(partial: Dict[str, Any]) -> None:
+                # 40-85% 按已完成的窗口数推进；关键时刻随完成随发布，前端可先渲染时间轴
+                fields: Dict[str, Any] = {"partial": partial}
+                if partial.get("total"):
+                    fields["progress"] = 40 + int(45 * partial["done"] / partial["total"])
+                    fields["step"] = f"{step_msg}：已完成 {partial['done']}/{partial['total']}"
+                job_store.update(job_id, **fields)
+
+            # 始终按规范语言（中文）分析；其他语言在保存后生成翻译层
+            ai_result = self._call_vision_llm(video_path, weapon_hint, CANONICAL_LANG, info, on_partial)
 
             job_store.update(job_id, progress=85, step="汇总分析结果")
             result = {
@@ -729,36 +726,43 @@ class LocalVideoProcessor:
                 "fps": info["fps"],
                 "resolution": f"{info['width']}x{info['height']}",
                 "file_size_mb": round(size_mb, 2),
-                "analyze_path": "b64" if file_size <= B64_THRESHOLD else "compress_b64",
+                "analyze_path": analyze_path,
                 "key_moments": ai_result.get("key_moments", []),
                 "actions": ai_result.get("actions", []),
                 "text_in_video": ai_result.get("text_in_video", []),
                 "summary": ai_result.get("summary", ""),
                 "weapon_guess": ai_result.get("weapon_guess", weapon_hint or "未知"),
+                "windows": ai_result.get("windows", []),
                 "analyzed_at": datetime.now().isoformat(),
             }
 
+            result["lang"] = CANONICAL_LANG
             self._save_analysis(video_id, result)
+            if lang in TRANSLATABLE_LANGS:
+                job_store.update(job_id, progress=90, step="翻译分析结果")
+                result = self.load_analysis(video_id, lang) or result
             job_store.update(
                 job_id,
                 status="done",
                 progress=100,
                 step="完成",
                 result=result,
+                partial=None,
             )
         except Exception as e:
             logger.exception("analyze worker 失败")
             job_store.update(job_id, status="error", error=str(e), step="失败")
 
+    # ----------------------------------------------------------
+    # 分析结果存储：规范结果 + 按语言的翻译层
+    # ----------------------------------------------------------
     @staticmethod
-    def _save_analysis(video_id: str, result: Dict[str, Any]) -> None:
-        path = os.path.join(ANALYSIS_DIR, f"{video_id}.json")
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+    def _analysis_file(video_id: str, lang: Optional[str] = None) -> str:
+        name = f"{video_id}.json" if not lang or lang == CANONICAL_LANG else f"{video_id}.{lang}.json"
+        return os.path.join(ANALYSIS_DIR, name)
 
     @staticmethod
-    def load_analysis(video_id: str) -> Optional[Dict[str, Any]]:
-        path = os.path.join(ANALYSIS_DIR, f"{video_id}.json")
+    def _read_json(path: str) -> Optional[Dict[str, Any]]:
         if not os.path.exists(path):
             return None
         try:
@@ -767,24 +771,65 @@ class LocalVideoProcessor:
         except Exception:
             return None
 
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def _save_analysis(self, video_id: str, result: Dict[str, Any]) -> None:
+        """写规范结果；旧的翻译层随之失效"""
+        self._write_json(self._analysis_file(video_id), result)
+        for lang in TRANSLATABLE_LANGS:
+            try:
+                os.remove(self._analysis_file(video_id, lang))
+            except OSError:
+                pass
+
+    def _layer_lock(self, key: str) -> threading.Lock:
+        with self._layer_locks_guard:
+            return self._layer_locks.setdefault(key, threading.Lock())
+
+    def load_analysis(self, video_id: str, lang: str = CANONICAL_LANG) -> Optional[Dict[str, Any]]:
+        """读分析结果；en/ja 叠加翻译层，翻译层不存在时现场翻译一次并缓存
+
+        切换界面语言只是读文件，不会重新分析视频。翻译失败时返回中文结果，lang 标为 zh。
+        """
+        canonical = self._read_json(self._analysis_file(video_id))
+        if not canonical or lang not in TRANSLATABLE_LANGS or canonical.get("lang", CANONICAL_LANG) == lang:
+            return canonical
+
+        layer_path = self._analysis_file(video_id, lang)
+        with self._layer_lock(layer_path):
+            layer = self._read_json(layer_path)
+            if layer is None:
+                translated = self._translate_analysis(copy.deepcopy(canonical), lang)
+                layer = {k: translated[k] for k in TRANSLATED_FIELDS if k in translated}
+                # 翻译失败时原样返回中文（并如实标为中文），不缓存，下次请求再试
+                if not any(layer.get(k) != canonical.get(k) for k in layer):
+                    return dict(canonical, lang=CANONICAL_LANG)
+                layer["translated_at"] = datetime.now().isoformat()
+                self._write_json(layer_path, layer)
+        return dict(canonical, **layer, lang=lang)
+
     @staticmethod
     def save_upload(filename: str, content: bytes) -> Dict[str, Any]:
         """保存上传文件，返回 video_id 与文件路径"""
-        ext = os.path.splitext(filename)[1].lower()
-        if ext not in ALLOWED_EXT:
-            raise ValueError(f"不支持的视频格式: {ext}")
-        if len(content) > MAX_FILE_SIZE:
-            raise ValueError(f"文件过大，超过 {MAX_FILE_SIZE // 1024 // 1024}MB 限制")
-        video_id = LocalVideoProcessor.compute_video_id(filename, content)
-        path = os.path.join(UPLOAD_DIR, f"{video_id}{ext}")
-        with open(path, "wb") as f:
-            f.write(content)
-        return {
-            "video_id": video_id,
-            "path": path,
-            "size": len(content),
-            "ext": ext,
-        }
+        return LocalVideoProcessor.save_upload_stream(filename, io.BytesIO(content))
+
+    @staticmethod
+    def save_upload_stream(filename: str, stream: BinaryIO) -> Dict[str, Any]:
+        """流式保存上传文件：按 UPLOAD_CHUNK_SIZE 分块写盘，边写边算完整内容哈希
+
+        整个文件从不整体读入内存；同内容的视频只存一份（见 video_store）。
+        """
+        return video_store.ingest_stream(filename, stream)
+
+    @staticmethod
+    def save_upload_file(filename: str, path: str) -> Dict[str, Any]:
+        """把磁盘上已完整的文件（分片上传的 part）入库，不再复制一遍"""
+        return video_store.ingest_file(filename, path)
 
     @staticmethod
     def build_chat_context(analysis: Dict[str, Any]) -> str:
@@ -814,10 +859,3 @@ class LocalVideoProcessor:
             parts.append("视频中出现的文字/字幕：\n" + "\n".join(f"- {t}" for t in txt[:8]))
         return "\n\n".join(parts)
 
-
-# 简单 Pillow 缺失保护
-try:
-    from PIL import Image  # noqa: F401
-except ImportError:
-    logger.error("缺少依赖 Pillow，请 pip install Pillow")
-    raise
@@ -0,0 +1,245 @@
+"""
+模型输出解析 - 从 LLM 回复里取 JSON / 列表项
+
+- strip_think：去掉 M3 等推理模型的 <think>...</think> 思考段
+- extract_json：定位最外层 JSON 对象并解码。完整输出直接交给 C 实现的 raw_decode；
+  被 max_tokens 截断时，用正则按 token 扫一遍（字符串整体跳过，不逐字符循环），
+  记录最后一个安全截断点，补齐未闭合的 ] / } 后再解码
+- extract_list_items：把"每行一个"的回复拆成条目（去编号 / 项目符号），供快速提问等使用
+- StreamItemParser：流式（SSE）输出边收边解析：<think> 段在流中直接丢弃，
+  key_moments / actions 数组里的元素一闭合就交给调用方
+
+python -m utils.model_output 对 data/analysis 下保存的结果做微基准。
+"""
+import re
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+THINK_START = "<think>"
+THINK_END = "</think>"
+# think 未闭合时给 result_text 兜底保留的原文尾部长度（字符）
+RAW_TAIL_CHARS = 16 * 1024
+
+_DECODER = json.JSONDecoder()
+# 字符串（可能未闭合：group(1) 为空）或结构字符
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*(")?|[{}\[\],]', re.S)
+_CLOSERS = {"{": "}", "[": "]"}
+_LIST_PREFIX_RE = re.compile(r'^(?:[0-9]+[\.、\)）\s]|[①②③④⑤⑥⑦⑧⑨⑩]|[-*•·])\s*')
+
+
+def strip_think(text: str) -> str:
+    """去掉 <think> 段：有结束标签取其后内容，否则原样返回"""
+    idx = text.rfind(THINK_END)
+    if idx < 0:
+        return text
+    rest = text[idx + len(THINK_END):].strip()
+    # think 段后为空（极端情况）时退回整段
+    return rest or text
+
+
+def _repair(text: str, start: int) -> Optional[Any]:
+    """从 start 处的 { 开始扫描；对象完整时原样解码，被截断时补齐括号后解码"""
+    stack: List[str] = []
+    cut_pos, cut_stack = -1, ""
+    prev = ""
+    for m in _TOKEN_RE.finditer(text, start):
+        tok = m.group()
+        ch = tok[0]
+        if ch == '"':
+            if m.group(1) is None:
+                break  # 字符串被截断
+            prev = ch
+            continue
+        if ch in "{[":
+            if prev == "[":
+                # 数组首元素：截在元素之前，得到空数组而不是含一个空对象的数组
+                cut_pos, cut_stack = m.start(), "".join(stack)
+            stack.append(ch)
+            if not (len(stack) > 1 and stack[-2] == "["):
+                cut_pos, cut_stack = m.end(), "".join(stack)
+        elif ch in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            if not stack:
+                try:
+                    return json.loads(text[start:m.end()])
+                except ValueError:
+                    return None
+            cut_pos, cut_stack = m.end(), "".join(stack)
+        else:  # ","：在逗号前截断，丢掉其后不完整的元素
+            cut_pos, cut_stack = m.start(), "".join(stack)
+        prev = ch
+    else:
+        # 正好断在一个完整值之后（不在字符串中）：直接补括号
+        tail = text[start:].rstrip().rstrip(",")
+        try:
+            return json.loads(tail + "".join(_CLOSERS[c] for c in reversed(stack)))
+        except ValueError:
+            pass
+    if cut_pos < 0:
+        return None
+    closers = "".join(_CLOSERS[c] for c in reversed(cut_stack))
+    try:
+        return json.loads(text[start:cut_pos] + closers)
+    except ValueError:
+        return None
+
+
+def extract_json(text: str) -> Optional[Dict[str, Any]]:
+    """从模型回复中取出最外层 JSON 对象；取不到返回 None"""
+    if not text:
+        return None
+    body = strip_think(text)
+    # 有 markdown 代码块时从代码块里的第一个 { 开始，避免被前面说明文字里的括号干扰
+    fence = body.find("```")
+    start = body.find("{", fence if fence >= 0 else 0)
+    if start < 0:
+        start = body.find("{")
+        if start < 0:
+            return None
+    try:
+        obj, _ = _DECODER.raw_decode(body, start)
+    except ValueError:
+        obj = _repair(body, start)
+    return obj if isinstance(obj, dict) else None
+
+
+def extract_list_items(text: str, limit: int = 0, min_len: int = 3) -> List[str]:
+    """按行拆出条目：去掉编号（1. 1、 ①）与项目符号，过滤过短的行"""
+    items: List[str] = []
+    for line in strip_think(text or "").splitlines():
+        line = _LIST_PREFIX_RE.sub("", line.strip()).strip()
+        if len(line) >= min_len:
+            items.append(line)
+            if limit and len(items) >= limit:
+                break
+    return items
+
+
+class StreamItemParser:
+    """增量解析流式模型输出
+
+    feed(chunk) 返回本次新闭合的 (数组名, 元素) 列表：只关心根对象下 array_keys 指定的数组，
+    元素是对象且其右括号到达时立即解码。状态跨 chunk 保留，每个字符只扫描一次。
+    text 为去掉 <think> 段后的累计正文，结束后交给 extract_json 做最终解析。
+    思考段不整段保留：</think> 只在新 chunk 附近查找，raw 只留最近 RAW_TAIL_CHARS 个字符，
+    进入正文后清空；total_chars 为累计收到的字符数。
+    """
+
+    def __init__(self, array_keys: Iterable[str] = ("key_moments", "actions")) -> None:
+        self.array_keys = set(array_keys)
+        self.raw = ""          # 正文之前的原始输出（只保留尾部）
+        self.total_chars = 0
+        self.text = ""         # 去掉 <think> 后的正文
+        self._mode = "detect"  # detect → think → body
+        self._pos = 0          # text 中已扫描到的位置
+        self._stack: List[Tuple[str, Optional[str], int]] = []  # (括号, 所属键, 起始位置)
+        self._in_string = False
+        self._escape = False
+        self._str_start = 0
+        self._last_key: Optional[str] = None
+        self._done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        if not chunk:
+            return []
+        self.total_chars += len(chunk)
+        if self._mode == "body":
+            self.text += chunk
+            return self._scan()
+        self.raw += chunk
+        if self._mode == "detect":
+            head = self.raw.lstrip()
+            if len(head) < len(THINK_START) and THINK_START.startswith(head):
+                return []  # 还不能判断是否以 <think> 开头
+            if not head.startswith(THINK_START):
+                self._mode = "body"
+                self.text, self.raw = self.raw, ""
+                return self._scan()
+            self._mode = "think"
+            # 第一次进入 think：整段都是新内容，从头找
+            idx = self.raw.find(THINK_END)
+        else:
+            # </think> 可能跨 chunk：从上一段末尾 len(THINK_END) - 1 个字符开始找
+            idx = self.raw.find(THINK_END, max(0, len(self.raw) - len(chunk) - len(THINK_END) + 1))
+        if idx < 0:
+            if len(self.raw) > RAW_TAIL_CHARS:
+                self.raw = self.raw[-RAW_TAIL_CHARS:]
+            return []
+        self._mode = "body"
+        self.text, self.raw = self.raw[idx + len(THINK_END):], ""
+        return self._scan()
+
+    def _scan(self) -> List[Tuple[str, Dict[str, Any]]]:
+        items: List[Tuple[str, Dict[str, Any]]] = []
+        text = self.text
+        i, n = self._pos, len(text)
+        while i < n and not self._done:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._stack and self._stack[-1][0] == "{":
+                        self._last_key = text[self._str_start + 1:i]
+            elif ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._str_start = i
+            elif ch == "{" or ch == "[":
+                key = self._last_key if self._stack and self._stack[-1][0] == "{" else None
+                self._stack.append((ch, key, i))
+                self._last_key = None
+            elif ch == "}" or ch == "]":
+                if self._stack:
+                    _, _, start = self._stack.pop()
+                    if not self._stack:
+                        self._done = True  # 根对象结束，后面的内容不再关心
+                    elif (ch == "}" and len(self._stack) == 2 and self._stack[-1][0] == "["
+                          and self._stack[-1][1] in self.array_keys):
+                        try:
+                            item = json.loads(text[start:i + 1])
+                        except ValueError:
+                            item = None
+                        if isinstance(item, dict):
+                            items.append((self._stack[-1][1], item))
+            i += 1
+        self._pos = i
+        return items
+
+    def result_text(self) -> str:
+        """最终用于 extract_json 的文本：think 未闭合（输出被截断在思考阶段）时退回原文尾部"""
+        return self.text if self._mode == "body" else self.raw
+
+
+if __name__ == "__main__":
+    # 微基准：用 data/analysis 下保存的结果构造几类典型模型输出，统计解析耗时与截断修复率
+    import os
+    import sys
+    import timeit
+
+    analysis_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "analysis")
+    samples = {"plain": [], "think+fence": [], "truncated": []}
+    for name in sorted(os.listdir(analysis_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(analysis_dir, name), "r", encoding="utf-8") as f:
+            raw = json.dumps(json.load(f), ensure_ascii=False, indent=2)
+        samples["plain"].append(raw)
+        samples["think+fence"].append(f"<think>{'让我先看一下视频内容。' * 200}</think>\n```json\n{raw}\n```")
+        for ratio in (0.5, 0.7, 0.9):
+            samples["truncated"].append(raw[:int(len(raw) * ratio)])
+
+    for kind, texts in samples.items():
+        if not texts:
+            continue
+        ok = sum(1 for t in texts if extract_json(t) is not None)
+        number = 200
+        secs = timeit.timeit(lambda: [extract_json(t) for t in texts], number=number)
+        size = sum(len(t.encode("utf-8")) for t in texts)
+        print(f"{kind:12s} {len(texts):3d} 条  解析成功 {ok}/{len(texts)}  "
+              f"{secs / number / len(texts) * 1e6:8.1f} µs/条  {size * number / secs / 1e6:7.1f} MB/s")
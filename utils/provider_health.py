@@ -0,0 +1,226 @@
+"""
+LLM 提供商健康状态 - 指数退避重试 + 熔断器
+
+- 每个提供商（deepseek / minimax）一个熔断器：连续 N 次失败后打开，打开期间请求直接被拒，
+  聊天立即回退本地知识库，而不是在已经挂掉的接口上等满超时
+- 只有"接口不可达"才算失败：连接错误、超时、502/503/504；4xx 和 M3 偶发的 500 说明服务
+  还活着，只做重试不计入熔断
+- 重试间隔为带全抖动的指数退避：uniform(0, min(cap, base * 2^n))
+- 熔断打开后由后台探测线程定期请求 {base_url}/models，接口恢复响应即关闭熔断；
+  超过 reset_timeout 仍未探测成功时放行一个试探请求（半开）
+"""
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional
+
+import requests
+
+from config import Config
+from utils.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+# 计入熔断的 HTTP 状态码（网关/服务不可用）
+BREAKER_STATUSES = {502, 503, 504}
+# 值得重试的 HTTP 状态码（限流与服务端错误）
+RETRY_STATUSES = {429, 500} | BREAKER_STATUSES
+
+
+def backoff_delay(attempt: int, base: float = Config.RETRY_BASE_DELAY,
+                  cap: float = Config.RETRY_MAX_DELAY) -> float:
+    """第 attempt 次（从 0 开始）失败后的等待秒数，全抖动避免多个请求同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ProviderUnavailable(RuntimeError):
+    """熔断打开，提供商暂不可用"""
+
+    def __init__(self, provider: str) -> None:
+        super().__init__(f"{provider} 暂不可用（熔断中）")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """closed → (连续失败 ≥ threshold) → open → (探测成功 / 超时后试探) → half_open → closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """当前是否放行一次请求；半开状态同一时刻只放行一个试探请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """只读检查（不占用半开试探名额）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN:
+                return time.time() - self.opened_at < self.reset_timeout
+            return self._trial_in_flight
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("熔断器 %s 关闭（服务恢复）", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = 0.0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """记一次失败；返回熔断器是否因此（重新）打开"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                reopened = self.state != self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._trial_in_flight = False
+                if reopened:
+                    logger.warning("熔断器 %s 打开（连续失败 %d 次）", self.name, self.failures)
+                return reopened
+            return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at or None}
+
+
+class ProviderHealth:
+    """各提供商熔断器 + 后台探测"""
+
+    def __init__(self, probe_urls: Dict[str, str], failure_threshold: int,
+                 reset_timeout: float, probe_interval: float) -> None:
+        self.probe_urls = dict(probe_urls)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            b = self._breakers.get(provider)
+            if b is None:
+                b = CircuitBreaker(provider, self.failure_threshold, self.reset_timeout)
+                self._breakers[provider] = b
+            return b
+
+    def is_open(self, provider: str) -> bool:
+        return self.breaker(provider).is_open()
+
+    def check(self, provider: str) -> None:
+        """熔断打开时直接抛 ProviderUnavailable（用于在昂贵的前置工作之前短路）"""
+        if self.is_open(provider):
+            raise ProviderUnavailable(provider)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: b.snapshot() for name, b in breakers.items()}
+
+    def record(self, provider: str, ok: bool) -> None:
+        if ok:
+            self.breaker(provider).record_success()
+        elif self.breaker(provider).record_failure():
+            self._ensure_probe_thread()
+
+    def call(self, provider: str, send: Callable[[], requests.Response], attempts: int = 3,
+             retry_read_timeout: bool = True) -> requests.Response:
+        """带熔断与退避重试地发送请求
+
+        send 每次调用发出一次请求并返回 Response。重试用尽后返回最后一次 Response
+        （调用方自行判断状态码）或抛出最后一次网络异常；熔断打开时抛 ProviderUnavailable。
+        retry_read_timeout=False 时读超时不再重试（交互请求不把等待时间翻倍）。
+        """
+        breaker = self.breaker(provider)
+        last_exc: Optional[Exception] = None
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise ProviderUnavailable(provider)
+            try:
+                r = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record(provider, False)
+                last_exc = e
+                if isinstance(e, requests.ReadTimeout) and not retry_read_timeout:
+                    raise
+                reason = f"{type(e).__name__}: {e}"
+            else:
+                self.record(provider, r.status_code not in BREAKER_STATUSES)
+                if r.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return r
+                last_exc = None
+                reason = f"HTTP {r.status_code}"
+                r.close()  # 流式响应不读完就归还连接
+            if attempt < attempts - 1:
+                delay = backoff_delay(attempt)
+                print(f"[{provider}] 第 {attempt + 1}/{attempts} 次失败（{reason}），{delay:.1f}s 后重试", flush=True)
+                time.sleep(delay)
+        raise last_exc
+
+    # ----------------------------------------------------------
+    # 后台探测
+    # ----------------------------------------------------------
+    def _ensure_probe_thread(self) -> None:
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="provider-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                pending = [(name, b) for name, b in self._breakers.items() if b.state != CircuitBreaker.CLOSED]
+            if not pending:
+                continue
+            for name, b in pending:
+                url = self.probe_urls.get(name)
+                if url and self.probe(url):
+                    b.record_success()
+
+    @staticmethod
+    def probe(url: str) -> bool:
+        """接口能正常应答（哪怕 401/404）即视为可达"""
+        try:
+            r = http_client.get(url, "probe")
+        except requests.RequestException:
+            return False
+        return r.status_code not in BREAKER_STATUSES
+
+
+provider_health = ProviderHealth(
+    probe_urls={
+        "deepseek": f"{Config.DEEPSEEK_BASE_URL.rstrip('/')}/models",
+        "minimax": f"{Config.MINIMAX_BASE_URL.rstrip('/')}/models",
+    },
+    failure_threshold=Config.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=Config.BREAKER_RESET_TIMEOUT,
+    probe_interval=Config.HEALTH_PROBE_INTERVAL,
+)
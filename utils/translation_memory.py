@@ -0,0 +1,188 @@
+"""
+翻译记忆 - 分析结果字段的 zh → en/ja 短语级缓存
+
+"进攻/防守/得分"、"弓步直刺"、"格挡还击" 这类短语几乎出现在每条 key_moments / actions 里，
+逐次发给模型既费 token 又慢：
+- 预置词条：FIEDataCollector.I18N（剑种、项目、国家、地点、赛事名等）+ 常见动作 / 类型词
+- 已有译文的行直接本地返回，只把缺失的行合并成一次批量请求交给调用方提供的翻译函数
+- 只学习调用方标明的术语类短句（类型 / 动作 / 剑种），且模型必须逐行答全、译文通过校验；
+  存在 data/translation_memory.db（SQLite，多个 worker 共享），超过
+  TRANSLATION_MEMORY_MAX_ENTRIES 条按最近使用时间淘汰
+"""
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, Collection, Dict, Iterable, List, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 超过该长度的短语不入库：术语字段正常不会这么长
+MAX_PHRASE_LEN = 40
+# 两次淘汰检查的最小间隔（秒）
+PRUNE_INTERVAL = 60
+
+# 分析结果里高频的类型 / 动作词
+ANALYSIS_TERMS = {
+    "进攻": {"en": "Attack", "ja": "攻撃"},
+    "防守": {"en": "Defense", "ja": "守備"},
+    "得分": {"en": "Score", "ja": "得点"},
+    "失误": {"en": "Miss", "ja": "ミス"},
+    "精彩": {"en": "Highlight", "ja": "ハイライト"},
+    "直刺": {"en": "Straight thrust", "ja": "直突き"},
+    "劈": {"en": "Cut", "ja": "斬り"},
+    "劈砍": {"en": "Cut", "ja": "斬り"},
+    "格挡": {"en": "Parry", "ja": "受け"},
+    "还击": {"en": "Riposte", "ja": "リポスト"},
+    "格挡还击": {"en": "Parry-riposte", "ja": "受けからのリポスト"},
+    "弓步": {"en": "Lunge", "ja": "ランジ"},
+    "弓步直刺": {"en": "Lunge with straight thrust", "ja": "ランジからの直突き"},
+    "冲刺": {"en": "Flèche", "ja": "フレッシュ"},
+    "反击": {"en": "Counter-attack", "ja": "カウンターアタック"},
+    "转移刺": {"en": "Disengage", "ja": "デガジェ"},
+    "试探": {"en": "Probing", "ja": "探り"},
+    "未知": {"en": "unknown", "ja": "不明"},
+}
+
+# 不含汉字 / 假名的行（数字、比分、英文姓名）无需翻译
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u4e00-\u9fff]")
+
+
+def needs_translation(text: str) -> bool:
+    return bool(_CJK_RE.search(text or ""))
+
+
+class TranslationMemory:
+    """zh → 目标语言的短语记忆（预置词条 + SQLite 中的已学词条）"""
+
+    def __init__(self, path: str, seed: Dict[str, Dict[str, str]], max_entries: int = 5000) -> None:
+        self.path = path
+        self.max_entries = max(0, max_entries)
+        self._local = threading.local()
+        self._last_prune = 0.0
+        self._seed: Dict[str, Dict[str, str]] = {}
+        for zh, targets in seed.items():
+            for lang, text in targets.items():
+                self._seed.setdefault(lang, {})[zh] = text
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS phrases (
+                    lang    TEXT NOT NULL,
+                    source  TEXT NOT NULL,
+                    target  TEXT NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (lang, source)
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_phrases_used ON phrases (used_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, text: str, lang: str) -> str:
+        """已有译文返回译文，否则返回空串"""
+        return self.lookup_many([text], lang).get(text, "")
+
+    def lookup_many(self, texts: List[str], lang: str) -> Dict[str, str]:
+        """批量查已有译文，返回命中的 {原文: 译文}；已学词条顺带刷新使用时间"""
+        seed = self._seed.get(lang, {})
+        found = {t: seed[t] for t in texts if t in seed}
+        rest = [t for t in texts if t not in found and len(t) <= MAX_PHRASE_LEN]
+        if not rest:
+            return found
+        conn = self._conn()
+        learned: Dict[str, str] = {}
+        for i in range(0, len(rest), 500):
+            part = rest[i:i + 500]
+            rows = conn.execute(
+                f"SELECT source, target FROM phrases WHERE lang = ? AND source IN ({','.join('?' * len(part))})",
+                [lang, *part]).fetchall()
+            learned.update(rows)
+        if learned:
+            with conn:
+                conn.executemany("UPDATE phrases SET used_at = ? WHERE lang = ? AND source = ?",
+                                 [(time.time(), lang, src) for src in learned])
+        found.update(learned)
+        return found
+
+    @staticmethod
+    def _plausible(source: str, target: str, lang: str) -> bool:
+        """模型译文的基本校验：非空、不是原文、长度正常；英文译文里不应再有汉字"""
+        target = target.strip()
+        if not target or target == source or "\t" in target or "\n" in target:
+            return False
+        if len(target) > 4 * len(source) + 40:
+            return False
+        return lang != "en" or not needs_translation(target)
+
+    def remember(self, lang: str, pairs: Dict[str, str]) -> None:
+        pairs = {zh: tr.strip() for zh, tr in pairs.items()
+                 if len(zh) <= MAX_PHRASE_LEN and self._plausible(zh, tr, lang)}
+        if not pairs or not self.max_entries:
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO phrases (lang, source, target, used_at) VALUES (?, ?, ?, ?)",
+                [(lang, zh, tr, now) for zh, tr in pairs.items()])
+            if now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                conn.execute(
+                    "DELETE FROM phrases WHERE rowid NOT IN "
+                    "(SELECT rowid FROM phrases ORDER BY used_at DESC LIMIT ?)", (self.max_entries,))
+
+    def translate(self, lines: Iterable[str], lang: str,
+                  translate_batch: Callable[[List[str]], Dict[str, str]],
+                  learnable: Optional[Collection[str]] = None) -> Dict[str, str]:
+        """返回 {原文: 译文}；记忆里没有的行合并成一次 translate_batch 调用
+
+        translate_batch 接收缺失行列表，返回 {原文: 译文}（可缺项，缺项保留原文）。
+        learnable：允许写入记忆的原文（术语类字段）；None 表示都不学习。
+        模型没有把缺失行全部答全时整批不学习（逐行错位的可能性大）。
+        """
+        result: Dict[str, str] = {}
+        candidates: List[str] = []
+        for line in dict.fromkeys(lines):
+            if needs_translation(line):
+                candidates.append(line)
+            else:
+                result[line] = line
+        hits = self.lookup_many(candidates, lang)
+        result.update(hits)
+        missing = [line for line in candidates if line not in hits]
+        logger.info("翻译记忆 → %s：命中 %d 行，请求模型 %d 行", lang, len(result), len(missing))
+        if missing:
+            translated = translate_batch(missing)
+            if learnable and all(translated.get(line) for line in missing):
+                self.remember(lang, {line: translated[line] for line in missing if line in learnable})
+            for line in missing:
+                result[line] = translated.get(line) or line
+        return result
+
+
+def _build_seed() -> Dict[str, Dict[str, str]]:
+    from utils.fie_data import FIEDataCollector
+
+    seed: Dict[str, Dict[str, str]] = {}
+    for table in FIEDataCollector.I18N.values():
+        for zh, targets in table.items():
+            if needs_translation(zh) and isinstance(targets, dict):
+                seed[zh] = dict(targets)
+    seed.update(ANALYSIS_TERMS)
+    return seed
+
+
+translation_memory = TranslationMemory(Config.TRANSLATION_MEMORY_PATH, _build_seed(),
+                                       max_entries=Config.TRANSLATION_MEMORY_MAX_ENTRIES)
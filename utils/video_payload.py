@@ -0,0 +1,93 @@
+"""
+M3 视频请求体构造 - 不在内存里拼出整段 base64
+
+视频以 data URL 内联在 JSON 里，直接 json.dumps 需要同时持有原始字节、base64 字符串和
+序列化后的 JSON（约为文件大小的 3-4 倍）。B64JsonBody 把请求体拆成三段按需生成：
+JSON 前缀 → 从文件分块读出并 base64 编码的视频 → JSON 后缀，内存占用与文件大小无关。
+PreparedBody 把这样的请求体只编码一次写入临时文件，M3 间歇性 500 重试时直接重发字节。
+"""
+import os
+import json
+import base64
+import tempfile
+from typing import Any, Dict, Iterable, Iterator
+
+# base64 按 3 字节一组编码；分块大小取 3 的倍数，块与块之间不产生填充
+B64_READ_CHUNK = 3 * 256 * 1024
+# PreparedBody 小于该大小时留在内存，超过则落到临时文件
+SPOOL_MAX_MEMORY = 1024 * 1024
+SEND_CHUNK = 1024 * 1024
+
+
+class B64JsonBody:
+    """可重复迭代的 JSON 请求体（requests 的 data= 参数）
+
+    payload 中需要放视频 base64 的位置写 PLACEHOLDER，例如
+    f"data:video/mp4;base64,{B64JsonBody.PLACEHOLDER}"。
+    实现了 __len__，requests 会据此发送 Content-Length 而不是 chunked 编码；
+    每次迭代都从头重新读文件，重试时可直接复用同一对象。
+    """
+
+    PLACEHOLDER = "\x00__VIDEO_B64__\x00"
+
+    def __init__(self, payload: Dict[str, Any], file_path: str, chunk_size: int = B64_READ_CHUNK) -> None:
+        if chunk_size % 3:
+            raise ValueError("chunk_size 必须是 3 的倍数")
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        encoded = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        marker = json.dumps(self.PLACEHOLDER)[1:-1].encode("utf-8")
+        if encoded.count(marker) != 1:
+            raise ValueError("payload 中必须恰好包含一个 PLACEHOLDER")
+        self.prefix, self.suffix = encoded.split(marker)
+        file_size = os.path.getsize(file_path)
+        self.b64_size = 4 * ((file_size + 2) // 3)
+
+    def __len__(self) -> int:
+        return len(self.prefix) + self.b64_size + len(self.suffix)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.prefix
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk)
+        yield self.suffix
+
+
+class PreparedBody:
+    """一次编码、多次发送的请求体
+
+    构造时把 body 的各块写入 SpooledTemporaryFile（大请求体落盘，不占内存），
+    之后每次迭代从头读出原样发送；用完调用 close()（或 with 语句）删除临时文件。
+    """
+
+    def __init__(self, body: Iterable[bytes], max_memory: int = SPOOL_MAX_MEMORY) -> None:
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        size = 0
+        for chunk in body:
+            self._file.write(chunk)
+            size += len(chunk)
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[bytes]:
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(SEND_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "PreparedBody":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,195 @@
+"""
+内容寻址视频存储 - 按完整内容哈希去重
+
+- video_id = BLAKE2s(全部内容) 的 16 位十六进制摘要，与文件名无关；
+  同一视频换名上传得到相同 id，load_analysis 缓存可直接命中
+- 上传流边写临时文件边增量哈希，不整体读入内存
+- 每份内容只存一份：{root}/{video_id}{ext}；落盘用硬链接"不存在才创建"，
+  并发上传同一内容时天然去重；同内容不同扩展名也硬链接到同一 blob
+- index.json 记录每个 blob 的大小与上传过的文件名（别名）；读改写在跨进程文件锁内进行，
+  多个 worker 同时上传不会互相覆盖
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from typing import Dict, Optional, Any, BinaryIO, Iterable
+
+from utils.file_lock import file_lock, unique_tmp_path
+
+logger = logging.getLogger(__name__)
+
+# BLAKE2s：32 位运算，前端 JS 也能快速增量计算同一摘要
+HASH_DIGEST_SIZE = 8
+
+
+def new_hasher() -> "hashlib._Hash":
+    return hashlib.blake2s(digest_size=HASH_DIGEST_SIZE)
+
+
+def hash_bytes(content: bytes) -> str:
+    h = new_hasher()
+    h.update(content)
+    return h.hexdigest()
+
+
+class VideoStore:
+    """内容寻址的上传目录"""
+
+    def __init__(self, root: str, allowed_ext: Iterable[str], max_size: int,
+                 chunk_size: int = 1024 * 1024) -> None:
+        self.root = root
+        self.allowed_ext = set(allowed_ext)
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.index_path = os.path.join(root, "index.json")
+        os.makedirs(root, exist_ok=True)
+
+    # ----------------------------------------------------------
+    # 查询
+    # ----------------------------------------------------------
+    def find(self, video_id: str) -> Optional[str]:
+        """按 video_id 找已存的 blob 路径（任意扩展名）"""
+        for ext in sorted(self.allowed_ext):
+            path = os.path.join(self.root, f"{video_id}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def aliases(self, video_id: str) -> Dict[str, Any]:
+        with file_lock(self.index_path):
+            return dict(self._read_index().get(video_id) or {})
+
+    # ----------------------------------------------------------
+    # 写入
+    # ----------------------------------------------------------
+    def _check_ext(self, filename: str) -> str:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in self.allowed_ext:
+            raise ValueError(f"不支持的视频格式: {ext}")
+        return ext
+
+    def _too_large(self) -> ValueError:
+        return ValueError(f"文件过大，超过 {self.max_size // 1024 // 1024}MB 限制")
+
+    def ingest_stream(self, filename: str, stream: BinaryIO) -> Dict[str, Any]:
+        """把上传流按块写入临时文件，同时增量计算完整内容哈希，最后入库"""
+        ext = self._check_ext(filename)
+        h = new_hasher()
+        size = 0
+        tmp_path = os.path.join(self.root, f".upload-{uuid.uuid4().hex}{ext}")
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise self._too_large()
+                    h.update(chunk)
+                    out.write(chunk)
+            if size == 0:
+                raise ValueError("文件内容为空")
+            return self._commit(tmp_path, h.hexdigest(), ext, size, filename)
+        finally:
+            self._unlink(tmp_path)
+
+    def ingest_file(self, filename: str, path: str) -> Dict[str, Any]:
+        """把已在同一文件系统上的完整文件（如分片上传的 part）入库：只读一遍算哈希，不复制"""
+        ext = self._check_ext(filename)
+        size = os.path.getsize(path)
+        if size == 0:
+            raise ValueError("文件内容为空")
+        if size > self.max_size:
+            raise self._too_large()
+        h = new_hasher()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                h.update(chunk)
+        return self._commit(path, h.hexdigest(), ext, size, filename)
+
+    def _commit(self, src_path: str, video_id: str, ext: str, size: int, filename: str) -> Dict[str, Any]:
+        """src_path 链接进库（调用方负责删除 src_path）；已有同内容 blob 时直接复用"""
+        path = os.path.join(self.root, f"{video_id}{ext}")
+        existing = self.find(video_id)
+        deduplicated = existing is not None
+        if existing is None:
+            self._link(src_path, path)
+        elif existing != path:
+            # 同内容不同扩展名：硬链接到已有 blob，不占额外空间
+            self._link(existing, path)
+
+        self.add_alias(video_id, filename, size)
+        if deduplicated:
+            logger.info("内容已存在，复用 blob %s（别名 %s）", video_id, filename)
+        return {
+            "video_id": video_id,
+            "path": path,
+            "size": size,
+            "ext": ext,
+            "deduplicated": deduplicated,
+        }
+
+    def add_alias(self, video_id: str, filename: str, size: int = 0) -> None:
+        """记录某个文件名指向该 blob；别名已存在时不重写索引"""
+        with file_lock(self.index_path):
+            index = self._read_index()
+            entry = index.get(video_id)
+            if entry and (not filename or filename in entry["names"]):
+                return
+            entry = index.setdefault(video_id, {"size": size, "names": []})
+            if filename:
+                entry["names"].append(filename)
+            entry["updated_at"] = time.time()
+            self._write_index(index)
+
+    def _link(self, src: str, dst: str) -> None:
+        """硬链接创建 dst（已存在视为并发写入的同一内容）；不支持硬链接时退化为复制"""
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            pass
+        except OSError:
+            tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # ----------------------------------------------------------
+    # 索引
+    # ----------------------------------------------------------
+    def _read_index(self) -> Dict[str, Any]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            # 损坏的索引挪到一边保留（可人工恢复），不在下一次写入时被空索引悄悄覆盖
+            backup = f"{self.index_path}.corrupt.{int(time.time())}"
+            logger.error("视频索引损坏，已移到 %s: %s", backup, e)
+            try:
+                os.replace(self.index_path, backup)
+            except OSError:
+                pass
+            return {}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        """调用方持有 file_lock(self.index_path)"""
+        tmp = unique_tmp_path(self.index_path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.index_path)
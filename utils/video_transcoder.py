@@ -0,0 +1,448 @@
+"""
+视频压缩引擎 - PyAV/libav 转码
+
+- plan_compression：编码前按时长和字节预算算出码率/分辨率（ABR + VBV 封顶），一次编码即落在预算内；
+  可指定输出帧率（与模型抽帧率对齐的低帧率代理），编码量按帧数同比下降
+- transcode_video：解码后的帧直接交给 libswscale 一次完成缩放 + 像素格式转换（frame.reformat），
+  循环里不经过 PIL / RGB 中转；输出 h264 / yuv420p，供 M3 base64 路径使用
+- TranscodePool：有界进程池，转码在子进程里跑满多核，不与 Flask 请求线程争 GIL；
+  长视频按关键帧切成若干段并行转码，再无损拼接（transcode_segmented）
+- ProxyCache：压缩结果按 video_id + 压缩参数持久缓存，换语言重分析 / 出错重试不再重复转码
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fractions import Fraction
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 目标长边（720p 档）
+TARGET_LONG_EDGE = 1280
+# 码率上限：720p 下再高对 M3 理解没有收益，只会变大
+MAX_VIDEO_BITRATE = 1_500_000
+# 每帧码率上限（低帧率代理时按帧数封顶，帧数少不需要 1.5Mbps）
+MAX_BITS_PER_FRAME = 200_000
+# 每帧码率低于该值时 720p 画质过差，改为降分辨率（≈ 30fps 下 400kbps）
+MIN_BITS_PER_FRAME_720P = 13_000
+# 时长未知时的保守码率
+FALLBACK_BITRATE = 800_000
+# 预算余量：容器开销 + 码率控制误差
+BUDGET_MARGIN = 0.9
+# 分段并行转码时每段的最短时长（秒），段太短时进程启动/拼接开销不划算
+MIN_SEGMENT_SEC = 30.0
+
+
+def source_fps(stream) -> float:
+    """读取源帧率；average_rate 可能是 Fraction/0（可变帧率）或 None"""
+    try:
+        fps = float(stream.average_rate) if stream.average_rate else 30.0
+    except Exception:
+        fps = 30.0
+    if fps <= 0 or fps > 120:
+        fps = 30.0
+    return fps
+
+
+def scaled_size(width: int, height: int, long_edge: int = TARGET_LONG_EDGE) -> Tuple[int, int]:
+    """按长边等比缩放，宽高都向下取偶数（yuv420p 要求，奇数边 libx264 打不开编码器）"""
+    long_edge -= long_edge % 2
+    if width >= height:
+        tgt_w, tgt_h = long_edge, int(height * long_edge / width)
+    else:
+        tgt_h, tgt_w = long_edge, int(width * long_edge / height)
+    return max(2, tgt_w - tgt_w % 2), max(2, tgt_h - tgt_h % 2)
+
+
+def plan_compression(info: Dict[str, Any], budget_bytes: int, fps: Optional[float] = None) -> Dict[str, Any]:
+    """根据时长与字节预算规划一次编码的参数
+
+    fps：输出帧率；None 表示保留源帧率，否则抽帧重编码为该帧率的低帧率代理。
+    返回 profile：{width, height, fps, bit_rate, options}，options 用 maxrate/bufsize（VBV）
+    封顶瞬时码率，避免 ABR 在复杂场景超预算。
+    """
+    src_w, src_h = info.get("width") or 0, info.get("height") or 0
+    duration = info.get("duration") or 0
+    out_fps = fps or info.get("fps") or 30.0
+    if duration > 0:
+        bit_rate = int(budget_bytes * 8 * BUDGET_MARGIN / duration)
+    else:
+        bit_rate = FALLBACK_BITRATE
+    cap = min(MAX_VIDEO_BITRATE, int(MAX_BITS_PER_FRAME * out_fps))
+    bit_rate = max(32_000, min(cap, bit_rate))
+
+    # 码率不足时降分辨率保画质；源比目标小时不放大
+    long_edge = TARGET_LONG_EDGE
+    bits_per_frame = bit_rate / out_fps
+    if bits_per_frame < MIN_BITS_PER_FRAME_720P:
+        long_edge = 960 if bits_per_frame >= MIN_BITS_PER_FRAME_720P / 2 else 640
+    long_edge = min(long_edge, max(src_w, src_h) or long_edge)
+    width, height = scaled_size(src_w, src_h, long_edge)
+    return {
+        "width": width,
+        "height": height,
+        "fps": fps,
+        "bit_rate": bit_rate,
+        "options": {
+            "preset": "medium",
+            "maxrate": str(bit_rate),
+            "bufsize": str(bit_rate * 2),
+        },
+    }
+
+
+def keyframe_times(src_path: str) -> List[float]:
+    """只解复用不解码，列出视频流所有关键帧的时间（秒）"""
+    import av
+
+    times = []
+    with av.open(src_path) as src:
+        stream = src.streams.video[0]
+        for packet in src.demux(stream):
+            if packet.is_keyframe and packet.pts is not None:
+                times.append(float(packet.pts * packet.time_base))
+    return sorted(times)
+
+
+def split_segments(keyframes: List[float], duration: float, parts: int) -> List[Tuple[float, Optional[float]]]:
+    """按关键帧把 [0, duration) 切成至多 parts 段，边界对齐到离等分点最近的关键帧
+
+    返回 [(start, end)]，最后一段 end 为 None（读到文件结尾）。
+    """
+    bounds = [0.0]
+    for i in range(1, parts):
+        target = duration * i / parts
+        candidates = [k for k in keyframes if k > bounds[-1] + MIN_SEGMENT_SEC / 2]
+        if not candidates:
+            break
+        best = min(candidates, key=lambda k: abs(k - target))
+        if duration - best < MIN_SEGMENT_SEC / 2:
+            break
+        bounds.append(best)
+    return [(bounds[i], bounds[i + 1] if i + 1 < len(bounds) else None) for i in range(len(bounds))]
+
+
+def transcode_video(src_path: str, dst_path: str, profile: Dict[str, Any],
+                    start: Optional[float] = None, end: Optional[float] = None,
+                    rebase: bool = False) -> int:
+    """按 profile 把 src_path 转码为 h264 mp4，返回输出字节数
+
+    start/end（秒）：只转 [start, end) 这一段（start 应为关键帧时间），输出保留原始时间戳，
+    供分段并行转码后拼接。
+    rebase=True：输出时间戳以 start 为 0 点，得到可独立分析的片段（分窗分析用，start 可不在关键帧上）；
+    片段内时间 + start 即原视频时间（低帧率代理的时间槽按 start 所在槽对齐，误差不超过半个槽）。
+    """
+    import av
+
+    width, height = profile["width"], profile["height"]
+    src = av.open(src_path)
+    dst = av.open(dst_path, mode="w")
+    try:
+        src_stream = src.streams.video[0]
+        src_stream.thread_type = "AUTO"
+        out_fps = profile.get("fps")
+        if out_fps:
+            # 低帧率代理：非参考帧不需要解码
+            src_stream.codec_context.skip_frame = "NONREF"
+            rate = Fraction(out_fps).limit_denominator(1000)
+        else:
+            rate = Fraction(source_fps(src_stream)).limit_denominator(1000)
+
+        dst_stream = dst.add_stream("libx264", rate=rate)
+        dst_stream.width, dst_stream.height = width, height
+        dst_stream.pix_fmt = "yuv420p"
+        dst_stream.bit_rate = profile["bit_rate"]
+        dst_stream.options = dict(profile.get("options") or {})
+
+        next_slot = 0
+        # rebase 的 0 点固定为 start，而不是第一个保留下来的帧，否则片段整体偏移最多一个时间槽
+        base_pts = round(start * out_fps) if rebase and start and out_fps else 0
+        if start:
+            src.seek(int(start / src_stream.time_base), stream=src_stream, backward=True)
+            if out_fps:
+                # 与上一段的时间槽不重叠
+                next_slot = int(start * out_fps + 1 - 1e-3)
+        for frame in src.decode(src_stream):
+            if frame.time is not None:
+                if start and frame.time < start - 1e-3:
+                    continue
+                if end is not None and frame.time >= end - 1e-3:
+                    break
+            if out_fps:
+                # 抽帧：每个 1/fps 时间槽取第一帧，pts 以输出帧为单位
+                slot = int(frame.time * out_fps + 1e-3) if frame.time is not None else -1
+                if slot < next_slot:
+                    continue
+                pts = slot
+                next_slot = pts + 1
+                if rebase:
+                    pts = max(0, pts - base_pts)
+            # 缩放 + 转 yuv420p 在 libswscale 里一次完成
+            new_frame = frame.reformat(width=width, height=height, format="yuv420p",
+                                       interpolation="BILINEAR")
+            if out_fps:
+                new_frame.pts = pts
+                new_frame.time_base = 1 / rate
+            else:
+                if rebase and frame.pts is not None:
+                    new_frame.pts = max(0, frame.pts - round((start or 0) / frame.time_base))
+                else:
+                    new_frame.pts = frame.pts
+                new_frame.time_base = frame.time_base
+            for p in dst_stream.encode(new_frame):
+                dst.mux(p)
+        for p in dst_stream.encode():
+            dst.mux(p)
+    finally:
+        dst.close()
+        src.close()
+    return os.path.getsize(dst_path)
+
+
+def concat_segments(seg_paths: List[str], dst_path: str) -> int:
+    """把同参数编码的各段 mp4 无损拼接（只搬运 packet，不重新编码），返回输出字节数"""
+    import av
+
+    with av.open(dst_path, mode="w") as dst:
+        out_stream = None
+        last_dts = None
+        for path in seg_paths:
+            with av.open(path) as seg:
+                in_stream = seg.streams.video[0]
+                if out_stream is None:
+                    # PyAV ≥ 13 改名为 add_stream_from_template
+                    if hasattr(dst, "add_stream_from_template"):
+                        out_stream = dst.add_stream_from_template(in_stream)
+                    else:
+                        out_stream = dst.add_stream(template=in_stream)
+                for packet in seg.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+                    # 各段保留了原始时间戳；只需保证 dts 严格递增
+                    if last_dts is not None and packet.dts <= last_dts:
+                        shift = last_dts + 1 - packet.dts
+                        packet.dts += shift
+                        packet.pts += shift
+                    last_dts = packet.dts
+                    packet.stream = out_stream
+                    dst.mux(packet)
+    return os.path.getsize(dst_path)
+
+
+class TranscodePool:
+    """有界转码进程池
+
+    - backend="process"：ProcessPoolExecutor（spawn 启动，避免 fork 带上 Flask 线程状态）
+    - backend="inline"：在调用线程里直接执行（调试 / 单核机器）
+    同时提交的任务数上限为 workers + queue_size，超出时提交方阻塞，防止突发上传堆积内存。
+    """
+
+    def __init__(self, backend: str = "process", workers: int = 1, queue_size: int = 16) -> None:
+        self.backend = backend
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_size))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+        """提交任务；队列满时阻塞到有空位"""
+        self._slots.acquire()
+        if self.backend != "process":
+            fut: "Future[Any]" = Future()
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+            finally:
+                self._slots.release()
+            return fut
+        try:
+            fut = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            # 子进程崩溃（如 OOM 被杀）后进程池不可用，重建一次
+            logger.warning("转码进程池已损坏，重建")
+            self._reset_executor()
+            try:
+                fut = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _f: self._slots.release())
+        return fut
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return self.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise
+
+    def transcode(self, src_path: str, dst_path: str, profile: Dict[str, Any]) -> int:
+        return self.run(transcode_video, src_path, dst_path, profile)
+
+    def transcode_clip(self, src_path: str, dst_path: str, profile: Dict[str, Any],
+                       start: float, end: Optional[float]) -> int:
+        """截取 [start, end) 转码为时间戳从 0 开始的独立片段"""
+        return self.run(transcode_video, src_path, dst_path, profile, start, end, True)
+
+    def transcode_segmented(self, src_path: str, dst_path: str, profile: Dict[str, Any],
+                            duration: float, parts: Optional[int] = None) -> int:
+        """长视频按关键帧分段，各段并行提交到进程池转码，最后拼接为 dst_path
+
+        关键帧太少或时长不足以切成多段时退化为单次转码。
+        """
+        if self.backend != "process":
+            parts = 1
+        parts = parts or self.workers
+        segments: List[Tuple[float, Optional[float]]] = [(0.0, None)]
+        if parts > 1 and duration >= 2 * MIN_SEGMENT_SEC:
+            parts = min(parts, int(duration // MIN_SEGMENT_SEC))
+            segments = split_segments(keyframe_times(src_path), duration, parts)
+        if len(segments) == 1:
+            return self.transcode(src_path, dst_path, profile)
+
+        logger.info("分段并行转码: %d 段 %s", len(segments),
+                    ", ".join(f"{s:.1f}-{e:.1f}" if e else f"{s:.1f}-end" for s, e in segments))
+        seg_dir = os.path.join(os.path.dirname(dst_path), f".seg-{uuid.uuid4().hex[:8]}")
+        os.makedirs(seg_dir, exist_ok=True)
+        try:
+            seg_paths = [os.path.join(seg_dir, f"{i:03d}.mp4") for i in range(len(segments))]
+            futures = [self.submit(transcode_video, src_path, path, profile, start, end)
+                       for path, (start, end) in zip(seg_paths, segments)]
+            for fut in futures:
+                fut.result()
+            return concat_segments(seg_paths, dst_path)
+        finally:
+            shutil.rmtree(seg_dir, ignore_errors=True)
+
+    def shutdown(self) -> None:
+        self._reset_executor()
+
+
+class ProxyCache:
+    """压缩代理的磁盘缓存：{root}/{video_id}-{profile_key}.mp4
+
+    文件 mtime 作为 LRU 时钟（命中时刷新），总大小超过 max_bytes 时从最久未用的开始删。
+    正在使用的代理不会被删：本进程内用 use() 引用计数钉住，直到 M3 请求发完；
+    其他进程可能正在读的文件靠 mtime 保护（min_idle 秒内被取用过的不淘汰）。
+    """
+
+    def __init__(self, root: str, max_bytes: int, min_idle: float = 600) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.min_idle = min_idle
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._pins: Dict[str, int] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def profile_key(profile: Dict[str, Any]) -> str:
+        raw = json.dumps(profile, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def path_for(self, video_id: str, profile: Dict[str, Any]) -> str:
+        return os.path.join(self.root, f"{video_id}-{self.profile_key(profile)}.mp4")
+
+    def _key_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(path, threading.Lock())
+
+    def get_or_create(self, video_id: str, profile: Dict[str, Any],
+                      build: Callable[[str], Any]) -> str:
+        """命中直接返回代理路径；未命中调用 build(tmp_path) 生成后入缓存
+
+        同一 video_id + profile 同时只会转码一次，其余调用方等待并复用结果。
+        """
+        path = self.path_for(video_id, profile)
+        with self._key_lock(path):
+            if os.path.exists(path):
+                os.utime(path)
+                logger.info("压缩代理缓存命中: %s", os.path.basename(path))
+                return path
+            tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp.mp4"
+            try:
+                build(tmp)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        self.evict(keep=path)
+        return path
+
+    @contextmanager
+    def use(self, video_id: str, profile: Dict[str, Any], build: Callable[[str], Any]) -> Iterator[str]:
+        """get_or_create 并在 with 块内钉住该代理，期间 evict 不会删除它"""
+        path = self.path_for(video_id, profile)
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            yield self.get_or_create(video_id, profile, build)
+        finally:
+            with self._lock:
+                self._pins[path] -= 1
+                if not self._pins[path]:
+                    del self._pins[path]
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """按 mtime 从旧到新删除，直到总大小不超过上限（keep、钉住的和最近取用过的不删）"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                if not name.endswith(".mp4") or ".tmp." in name:
+                    continue
+                full = os.path.join(self.root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+            total = sum(size for _, size, _ in entries)
+            recent = time.time() - self.min_idle
+            for mtime, size, full in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if full == keep or full in self._pins or mtime >= recent:
+                    continue
+                try:
+                    os.remove(full)
+                    total -= size
+                    logger.info("淘汰压缩代理: %s", os.path.basename(full))
+                except OSError:
+                    pass
+
+
+transcode_pool = TranscodePool(
+    backend=Config.TRANSCODE_BACKEND,
+    workers=Config.TRANSCODE_WORKERS,
+    queue_size=Config.TRANSCODE_QUEUE_SIZE,
+)
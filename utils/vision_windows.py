@@ -0,0 +1,134 @@
+"""
+长视频分窗分析 - 切窗规划与结果合并
+
+M3 单次请求吃不下整场比赛（2-3 分钟以上常见 500 / 审核拒绝），长视频切成带重叠的
+时间窗分别分析，再把各窗结果按原视频时间轴合并：
+- plan_windows：等长切窗，相邻窗重叠 overlap 秒，避免动作被切在边界上
+- merge_windows：窗内相对时间 + 窗起点 = 绝对时间；重叠区各窗只保留自己"负责"的一半，
+  边界两侧同类事件相距很近时视为同一事件去重；文字去重、概述按时间段拼接、剑种多数表决
+"""
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# 边界两侧同类事件相距不超过该秒数视为同一事件
+DEDUP_GAP = 2.0
+UNKNOWN_WEAPONS = {"", "未知", "unknown", "不明"}
+
+
+def plan_windows(duration: float, window: float, overlap: float,
+                 grid: Optional[float] = None) -> List[Tuple[float, float]]:
+    """把 [0, duration] 切成若干等长、相邻重叠 overlap 秒、每段不超过 window 秒的时间窗
+
+    grid：窗起点对齐到该间隔的整数倍（低帧率代理的采样间隔），片段时间 + 窗起点与原视频时间精确对应。
+    窗终点取下一窗（对齐后的）起点 + overlap，相邻窗重叠始终正好 overlap 秒，window_bounds 的负责区间首尾相接。
+    """
+    if duration <= window:
+        return [(0.0, duration)]
+    step = window - overlap
+    count = math.ceil((duration - overlap) / step)
+    step = (duration - overlap) / count
+    starts = []
+    for i in range(count):
+        start = round(i * step, 3)
+        if grid:
+            start = round(round(start / grid) * grid, 3)
+        starts.append(start)
+    ends = [round(s + overlap, 3) for s in starts[1:]] + [duration]
+    return list(zip(starts, ends))
+
+
+def _to_seconds(value: Any) -> Optional[float]:
+    """模型输出的时间：秒数，或偶尔出现的 "m:ss" 字符串"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip().rstrip("s秒")
+        try:
+            if ":" in text:
+                minutes, seconds = text.split(":", 1)
+                return int(minutes) * 60 + float(seconds)
+            return float(text)
+        except ValueError:
+            return None
+    return None
+
+
+def offset_items(items: List[Dict[str, Any]], start: float, end: float,
+                 own_lo: float, own_hi: float) -> List[Dict[str, Any]]:
+    """窗内相对时间 → 绝对时间，只保留落在本窗负责区间 [own_lo, own_hi) 内的条目"""
+    out = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        t = _to_seconds(item.get("time"))
+        if t is None:
+            continue
+        t = min(max(t, 0.0), end - start)
+        abs_t = round(start + t, 1)
+        if own_lo <= abs_t < own_hi:
+            out.append(dict(item, time=abs_t))
+    return out
+
+
+def window_bounds(windows: List[Tuple[float, float]], index: int, overlap: float) -> Tuple[float, float]:
+    """第 index 个窗负责的时间区间：重叠区从中点一分为二
+
+    上界用下一窗起点计算（与下一窗的下界同一个表达式），相邻区间严格首尾相接。
+    """
+    start, _ = windows[index]
+    own_lo = start + overlap / 2 if index > 0 else float("-inf")
+    own_hi = windows[index + 1][0] + overlap / 2 if index < len(windows) - 1 else float("inf")
+    return own_lo, own_hi
+
+
+def _dedup(tagged: List[Tuple[int, Dict[str, Any]]], key: str) -> List[Dict[str, Any]]:
+    """按时间排序；来自不同窗、同类且相距 ≤ DEDUP_GAP 的条目只保留先出现的一条"""
+    tagged.sort(key=lambda x: x[1]["time"])
+    kept: List[Tuple[int, Dict[str, Any]]] = []
+    for win, item in tagged:
+        dup = any(
+            w != win and item["time"] - it["time"] <= DEDUP_GAP and it.get(key) == item.get(key)
+            for w, it in kept[-3:]
+        )
+        if not dup:
+            kept.append((win, item))
+    return [item for _, item in kept]
+
+
+def _fmt(sec: float) -> str:
+    return f"{int(sec // 60)}:{int(sec % 60):02d}"
+
+
+def merge_windows(windows: List[Tuple[float, float]], results: List[Optional[Dict[str, Any]]],
+                  overlap: float) -> Dict[str, Any]:
+    """把各窗的分析结果合并成一份整段结果（失败的窗为 None，直接跳过）"""
+    moments: List[Tuple[int, Dict[str, Any]]] = []
+    actions: List[Tuple[int, Dict[str, Any]]] = []
+    texts: List[str] = []
+    summaries: List[str] = []
+    weapons: Counter = Counter()
+    for i, res in enumerate(results):
+        if not res:
+            continue
+        start, end = windows[i]
+        own_lo, own_hi = window_bounds(windows, i, overlap)
+        moments += [(i, m) for m in offset_items(res.get("key_moments"), start, end, own_lo, own_hi)]
+        actions += [(i, a) for a in offset_items(res.get("actions"), start, end, own_lo, own_hi)]
+        for text in res.get("text_in_video") or []:
+            if text and text not in texts:
+                texts.append(text)
+        if res.get("summary"):
+            summaries.append(f"[{_fmt(start)}-{_fmt(end)}] {res['summary']}")
+        weapon = str(res.get("weapon_guess") or "").strip()
+        if weapon.lower() not in UNKNOWN_WEAPONS:
+            weapons[weapon] += 1
+
+    return {
+        "key_moments": _dedup(moments, "type"),
+        "actions": _dedup(actions, "action"),
+        "text_in_video": texts,
+        "summary": "\n".join(summaries),
+        "weapon_guess": weapons.most_common(1)[0][0] if weapons else "未知",
+        "windows": [{"start": s, "end": e, "ok": bool(results[i])} for i, (s, e) in enumerate(windows)],
+    }
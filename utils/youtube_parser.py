@@ -1,9 +1,10 @@
 import re
-import requests
 from typing import Dict, Optional, Tuple
 from urllib.parse import urlparse, parse_qs
 import json
 
+from utils.http_client import http_client
+
 class YouTubeParser:
     def __init__(self):
         self.video_id_patterns = [
@@ -11,10 +12,6 @@ class YouTubeParser:
             r'youtube\.com\/v\/([a-zA-Z0-9_-]{11})',
             r'youtube\.com\/watch\?.*v=([a-zA-Z0-9_-]{11})'
         ]
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
     
     def parse_url(self, url: str) -> Optional[Dict]:
         """解析YouTube链接"""
@@ -65,10 +62,7 @@ class YouTubeParser:
         """获取视频详细信息"""
         try:
             # 尝试获取视频页面
-            response = self.session.get(
-                f'https://www.youtube.com/watch?v={video_id}',
-                timeout=10
-            )
+            response = http_client.get(f'https://www.youtube.com/watch?v={video_id}')
             
             if response.status_code == 200:
                 # 尝试从页面中提取信息